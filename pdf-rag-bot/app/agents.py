@@ -6,20 +6,20 @@ from app.retriever import retrieve, format_context
 from app.prompts import SUMMARY_PROMPT
 from app.config import settings
 from langchain_core.prompts import ChatPromptTemplate
-from langchain_openai import ChatOpenAI
-from langchain_google_genai import ChatGoogleGenerativeAI
-from langchain_openai import AzureChatOpenAI
 
 def _llm_small():
     prov = settings.PROVIDER.lower()
     if prov == "openai":
+        from langchain_openai import ChatOpenAI
         return ChatOpenAI(model=settings.OPENAI_CHAT_MODEL, temperature=0.1, api_key=settings.OPENAI_API_KEY)
     if prov == "azure":
+        from langchain_openai import AzureChatOpenAI
         return AzureChatOpenAI(api_key=settings.AZURE_OPENAI_API_KEY,
                                azure_endpoint=settings.AZURE_OPENAI_ENDPOINT,
                                azure_deployment=settings.AZURE_OPENAI_CHAT_DEPLOYMENT,
                                temperature=0.1)
     if prov == "gemini":
+        from langchain_google_genai import ChatGoogleGenerativeAI
         return ChatGoogleGenerativeAI(model=settings.GEMINI_CHAT_MODEL, google_api_key=settings.GOOGLE_API_KEY, temperature=0.1)
     raise ValueError("Unsupported PROVIDER")
 
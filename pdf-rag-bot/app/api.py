@@ -1,35 +1,63 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, UploadFile, File, Form
 from fastapi.responses import JSONResponse
 from typing import List, Optional
-from app.loaders import load_pdfs
-from app.chunking import chunk_documents
-from app.vectorstore import index_documents
-from app.chains import build_rag_chain
-from app.agents import build_agent
+from app.jobs import get_queue
+from datetime import timedelta
 from app.config import settings
 from pathlib import Path
 from loguru import logger
 
-app = FastAPI(title="PDF RAG Chatbot", version="1.0")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Fresh node with SNAPSHOT_PATH set: serve the prebuilt corpus instead of re-embedding
+    if settings.SNAPSHOT_PATH:
+        from app.snapshot import restore_on_startup
+        restore_on_startup()
+    yield
+
+app = FastAPI(title="PDF RAG Chatbot", version="1.0", lifespan=lifespan)
 
 @app.post("/upload")
-async def upload(files: List[UploadFile] = File(...)):
+async def upload(files: List[UploadFile] = File(...), corpus_id: Optional[str] = Form(None)):
     paths = []
+    Path(settings.UPLOAD_DIR).mkdir(parents=True, exist_ok=True)
     for f in files:
         path = Path(settings.UPLOAD_DIR) / f.filename
         with open(path, "wb") as out:
             out.write(await f.read())
         paths.append(str(path))
-    docs = load_pdfs(paths)
-    chunks = chunk_documents(docs)
-    if not chunks:
-        return {"indexed": 0, "warning": "No text extracted from PDFs"}
-    index_documents(chunks)
-    return {"indexed": len(chunks)}
+    # Parsing/embedding runs on a background worker; poll /jobs/{job_id}
+    job_id = get_queue().submit(paths, corpus_id=corpus_id)
+    return JSONResponse(status_code=202, content={"job_id": job_id, "status": "queued"})
+
+@app.get("/jobs/{job_id}")
+async def job_status(job_id: str):
+    job = get_queue().get(job_id)
+    if job is None:
+        return JSONResponse(status_code=404, content={"error": f"Unknown job: {job_id}"})
+    return job
+
+@app.post("/jobs/{job_id}/cancel")
+async def job_cancel(job_id: str):
+    job = get_queue().cancel(job_id)
+    if job is None:
+        return JSONResponse(status_code=404, content={"error": f"Unknown job: {job_id}"})
+    return job
 
+@app.post("/jobs/{job_id}/retry")
+async def job_retry(job_id: str):
+    job = get_queue().retry(job_id)
+    if job is None:
+        return JSONResponse(status_code=404, content={"error": f"Unknown job: {job_id}"})
+    return job
+
+# Sync handler: FastAPI runs it in its threadpool, so concurrent questions
+# overlap (and their embeddings coalesce) instead of blocking the event loop.
 @app.post("/ask")
-async def ask(question: str = Form(...), session_id: str = Form("default"), doc_name: Optional[str] = Form(None)):
+def ask(question: str = Form(...), session_id: str = Form("default"), doc_name: Optional[str] = Form(None)):
     try:
+        from app.chains import build_rag_chain  # LangChain + provider SDK load on first question
         chain = build_rag_chain()
         payload = {"question": question}
         if doc_name:
@@ -43,9 +71,29 @@ async def ask(question: str = Form(...), session_id: str = Form("default"), doc_
 @app.post("/agent")
 async def agent(input: str = Form(...)):
     try:
+        from app.agents import build_agent
         agent = build_agent()
         result = agent.invoke({"input": input})
         return {"answer": str(result)}
     except Exception as e:
         logger.exception(e)
         return JSONResponse(status_code=500, content={"error": str(e)})
+
+@app.get("/metrics/query-embedder")
+async def query_embedder_metrics():
+    from app.embeddings import get_query_embeddings
+    emb = get_query_embeddings()
+    if not hasattr(emb, "stats"):
+        return {"coalescing": False}
+    return {"coalescing": True, **emb.stats()}
+
+@app.post("/maintenance/optimize")
+def maintenance_optimize(requantize: bool = Form(False), keep_days: float = Form(7.0)):
+    from app.vectorstore import StoreBusy, optimize_store
+    try:
+        return optimize_store(requantize=requantize, cleanup_older_than=timedelta(days=keep_days))
+    except StoreBusy as e:
+        return JSONResponse(status_code=409, content={"error": str(e)})
+    except Exception as e:
+        logger.exception(e)
+        return JSONResponse(status_code=500, content={"error": str(e)})
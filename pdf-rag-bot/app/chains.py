@@ -2,8 +2,6 @@ from typing import Dict, Any
 from langchain.schema.runnable import RunnableMap, RunnablePassthrough
 from langchain_community.chat_message_histories import ChatMessageHistory
 from langchain_core.runnables.history import RunnableWithMessageHistory
-from langchain_openai import ChatOpenAI, AzureChatOpenAI
-from langchain_google_genai import ChatGoogleGenerativeAI
 from app.prompts import ANSWER_PROMPT
 from app.retriever import retrieve, format_context
 from app.config import settings
@@ -14,12 +12,14 @@ _SESSION_STORE: dict[str, ChatMessageHistory] = {}
 def _get_llm():
     prov = settings.PROVIDER.lower()
     if prov == "openai":
+        from langchain_openai import ChatOpenAI
         return ChatOpenAI(
             model=settings.OPENAI_CHAT_MODEL,
             temperature=0.1,
             api_key=settings.OPENAI_API_KEY
         )
     if prov == "azure":
+        from langchain_openai import AzureChatOpenAI
         return AzureChatOpenAI(
             api_key=settings.AZURE_OPENAI_API_KEY,
             azure_endpoint=settings.AZURE_OPENAI_ENDPOINT,
@@ -27,6 +27,7 @@ def _get_llm():
             temperature=0.1,
         )
     if prov == "gemini":
+        from langchain_google_genai import ChatGoogleGenerativeAI
         return ChatGoogleGenerativeAI(
             model=settings.GEMINI_CHAT_MODEL,
             google_api_key=settings.GOOGLE_API_KEY,
@@ -39,17 +40,23 @@ def _get_history(session_id: str) -> ChatMessageHistory:
         _SESSION_STORE[session_id] = ChatMessageHistory()
     return _SESSION_STORE[session_id]
 
-# Retrieval step as a Runnable
+# Retrieval step as a Runnable; callers that already retrieved (the UI) pass "docs" to skip it
 def _retrieve_fn(inputs: Dict[str, Any]) -> Dict[str, Any]:
     question = inputs["question"]
-    where = inputs.get("where")
-    docs = retrieve(question, where=where)
+    docs = inputs.get("docs")
+    if docs is None:
+        docs = retrieve(question, where=inputs.get("where"), corpus_id=inputs.get("corpus_id"))
     return {"question": question, "docs": docs, "context": format_context(docs)}
 
 def build_rag_chain():
     llm = _get_llm()
     chain = (
-        RunnableMap({"question": lambda x: x["question"], "where": lambda x: x.get("where")})
+        RunnableMap({
+            "question": lambda x: x["question"],
+            "where": lambda x: x.get("where"),
+            "corpus_id": lambda x: x.get("corpus_id"),
+            "docs": lambda x: x.get("docs"),
+        })
         | _retrieve_fn
         | RunnableMap({
             "question": lambda x: x["question"],
@@ -2,13 +2,13 @@
 from pathlib import Path
 from pydantic_settings import BaseSettings, SettingsConfigDict
 from dotenv import load_dotenv
-import os
+import sys
 
 load_dotenv()
 
 class Settings(BaseSettings):
     # Provider selection
-    PROVIDER: str = "gemini"  # openai | azure | gemini
+    PROVIDER: str = "gemini"  # openai | azure | gemini | local (offline hashing embedder, no chat model)
 
     # OpenAI
     OPENAI_API_KEY: str | None = None
@@ -26,17 +26,48 @@ class Settings(BaseSettings):
     GEMINI_CHAT_MODEL: str = "gemini-2.5-pro"
     GEMINI_EMBED_MODEL: str = "text-embedding-004"
 
+    # Local (offline) embeddings for evaluation/tests
+    LOCAL_EMBED_DIM: int = 384
+
     # RAG params
     PERSIST_DIR: str = str(Path("./data/store").resolve())      # generic fallback
     UPLOAD_DIR: str = str(Path("./data/uploads").resolve())
     TOP_K: int = 6
     CHUNK_SIZE: int = 1200
     CHUNK_OVERLAP: int = 200
+    NEIGHBOR_EXPAND: int = 0        # adjacent chunks (each side, same page) merged into every hit
 
     # LanceDB params
     LANCE_DIR: str = str(Path("./.data/lancedb").resolve())     # good for Streamlit Cloud
     LANCE_TABLE: str = "pdf_rag"
 
+    # Background indexing jobs
+    JOBS_DB: str = str(Path("./data/store/jobs.sqlite3").resolve())
+    JOB_WORKERS: int = 1            # LanceDB tables want a single writer
+    JOB_LEASE_SECONDS: float = 300  # a running job with no heartbeat for this long is re-queued
+    INDEX_BATCH_SIZE: int | None = None  # extra cap on chunks per embedding request (None = provider max batch)
+    INDEX_BATCH_RETRIES: int = 3    # retries per failed embedding batch
+
+    # Embedding provider limits (None = built-in per-provider defaults)
+    EMBED_MAX_BATCH: int | None = None
+    EMBED_TPM: int | None = None
+    EMBED_CONCURRENCY: int | None = None
+
+    # Query-time micro-batching of concurrent question embeddings
+    QUERY_EMBED_COALESCE: bool = True
+    QUERY_EMBED_MAX_WAIT_MS: float = 5.0
+    QUERY_EMBED_MAX_BATCH: int = 32
+    QUERY_EMBED_TIMEOUT_S: float = 60.0     # a caller gives up waiting for its batch after this long
+
+    # Vector storage layout (applied to new tables, or to existing ones via `python -m app.maintenance --requantize`)
+    VECTOR_DIM: int | None = None           # keep only the first N dims for search (text-embedding-3-* support this)
+    VECTOR_DTYPE: str = "float32"           # float32 | float16 for the searchable column
+    VECTOR_RESCORE_INT8: bool = False       # with a compact column: full-dim int8 codes to re-rank its candidates
+    RESCORE_OVERSAMPLE: int = 4             # candidates fetched per requested hit when re-scoring
+
+    # Corpus snapshot imported at startup when the table is missing (see app/snapshot.py)
+    SNAPSHOT_PATH: str | None = None
+
     # Pydantic v2 settings config
     model_config = SettingsConfigDict(
         env_file=".env",           # also let pydantic read .env
@@ -47,7 +78,11 @@ def _maybe_override_from_streamlit_secrets(cfg: "Settings") -> None:
     """
     If running on Streamlit Cloud, read keys from st.secrets and
     override env/.env values. Safe no-op locally.
+    Only consulted when the process is already running Streamlit, so the API
+    and CLIs never pay for importing it.
     """
+    if "streamlit" not in sys.modules:
+        return
     try:
         import streamlit as st
         # Only override if present in st.secrets
@@ -76,7 +111,5 @@ def _maybe_override_from_streamlit_secrets(cfg: "Settings") -> None:
 settings = Settings()
 _maybe_override_from_streamlit_secrets(settings)
 
-# Ensure dirs exist (works both locally & on Streamlit Cloud)
-Path(settings.PERSIST_DIR).mkdir(parents=True, exist_ok=True)
-Path(settings.UPLOAD_DIR).mkdir(parents=True, exist_ok=True)
-Path(settings.LANCE_DIR).mkdir(parents=True, exist_ok=True)
+# Directories are created where they are first written (uploads, job DB, LanceDB),
+# not as an import side effect.
@@ -1,9 +1,21 @@
 from __future__ import annotations
+import math
 import os
+import queue
+import re
+import threading
+import time
+import zlib
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from loguru import logger
+from langchain_core.embeddings import Embeddings
 from app.config import settings
 
-from langchain_openai import OpenAIEmbeddings, AzureOpenAIEmbeddings
-from langchain_google_genai import GoogleGenerativeAIEmbeddings
+# Provider SDKs are imported inside get_embeddings(): only the configured one is ever loaded.
 
 
 def _normalize_gemini_model(name: str | None) -> str:
@@ -14,16 +26,59 @@ def _normalize_gemini_model(name: str | None) -> str:
     return name
 
 
+class LocalHashEmbeddings(Embeddings):
+    """
+    Offline stand-in embedder: hashed word unigrams + bigrams, L2-normalised.
+    Deterministic across processes; no network, no model download. Lexical only,
+    so use it for relative comparisons (evaluation, tests), not production answers.
+    """
+
+    def __init__(self, dim: int = 384):
+        self.dim = dim
+
+    def _embed(self, text: str) -> List[float]:
+        vec = [0.0] * self.dim
+        words = re.findall(r"\w+", (text or "").lower())
+        for gram in words + [f"{a} {b}" for a, b in zip(words, words[1:])]:
+            h = zlib.crc32(gram.encode("utf-8"))
+            vec[h % self.dim] += 1.0 if (h >> 31) & 1 else -1.0
+        norm = sum(v * v for v in vec) ** 0.5 or 1.0
+        return [v / norm for v in vec]
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [self._embed(t) for t in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._embed(text)
+
+
+def embedding_model_id() -> str:
+    """Stable "<provider>:<model>" id of the configured embedder (vectors are only comparable within one id)."""
+    provider = (settings.PROVIDER or "openai").lower()
+    if provider == "local":
+        return f"local:hash-{settings.LOCAL_EMBED_DIM}"
+    if provider == "gemini":
+        return f"gemini:{_normalize_gemini_model(settings.GEMINI_EMBED_MODEL)}"
+    if provider == "azure":
+        return f"azure:{settings.AZURE_OPENAI_EMBED_DEPLOYMENT}"
+    return f"openai:{settings.OPENAI_EMBED_MODEL or 'text-embedding-3-small'}"
+
+
 def get_embeddings():
     provider = (settings.PROVIDER or "openai").lower()
 
+    if provider == "local":
+        return LocalHashEmbeddings(dim=settings.LOCAL_EMBED_DIM)
+
     if provider == "gemini":
+        from langchain_google_genai import GoogleGenerativeAIEmbeddings
         # Requires GOOGLE_API_KEY in env
         os.environ.setdefault("GOOGLE_API_KEY", settings.GOOGLE_API_KEY or "")
         model = _normalize_gemini_model(settings.GEMINI_EMBED_MODEL)
         return GoogleGenerativeAIEmbeddings(model=model)
 
     if provider == "azure":
+        from langchain_openai import AzureOpenAIEmbeddings
         # For Azure you must have a deployment name, not a model name
         # settings.AZURE_OPENAI_EMBED_DEPLOYMENT should be set in .env
         return AzureOpenAIEmbeddings(
@@ -35,7 +90,368 @@ def get_embeddings():
         )
 
     # default: OpenAI
+    from langchain_openai import OpenAIEmbeddings
     return OpenAIEmbeddings(
         model=settings.OPENAI_EMBED_MODEL or "text-embedding-3-small",
         api_key=settings.OPENAI_API_KEY,
     )
+
+
+# ---------------------------
+# Provider-aware batching
+# ---------------------------
+
+@dataclass(frozen=True)
+class ProviderLimits:
+    max_batch: int          # inputs per embedding request
+    tokens_per_minute: int  # provider TPM quota shared by all requests
+    max_concurrency: int    # requests in flight
+
+
+# Conservative defaults; override with EMBED_MAX_BATCH / EMBED_TPM / EMBED_CONCURRENCY.
+PROVIDER_LIMITS: Dict[str, ProviderLimits] = {
+    # batchEmbedContents accepts at most 100 inputs per call
+    "gemini": ProviderLimits(max_batch=100, tokens_per_minute=300_000, max_concurrency=4),
+    # /v1/embeddings accepts up to 2048 inputs; TPM depends on the account tier
+    "openai": ProviderLimits(max_batch=2048, tokens_per_minute=1_000_000, max_concurrency=4),
+    # older Azure embedding deployments cap requests at 16 inputs; default quota is modest
+    "azure": ProviderLimits(max_batch=16, tokens_per_minute=120_000, max_concurrency=2),
+    # offline hashing embedder: CPU-bound, no quota
+    "local": ProviderLimits(max_batch=1024, tokens_per_minute=10**12, max_concurrency=1),
+}
+
+# Retryable failures come in two kinds: "send less" (the request was too big; split it,
+# waiting does not help) and "slow down" (quota, overload, network; back off and retry).
+# Anything else (bad key, bad model name, ...) is raised immediately.
+SIZE, THROTTLE = "size", "throttle"
+_SIZE_STATUS = {413}
+_THROTTLE_STATUS = {408, 429, 500, 502, 503, 504}
+_SIZE_ERRORS = ("too large", "payload size", "request entity", "maximum context length", "max_tokens",
+                "token limit", "too many tokens", "too many inputs", "batch size", "input array")
+_THROTTLE_ERRORS = ("rate limit", "rate_limit", "ratelimit", "quota", "resource exhausted", "resource_exhausted",
+                    "too many requests", "timeout", "timed out", "temporarily", "unavailable",
+                    "connection error", "connection reset", "connection aborted", "server error")
+_STATUS_IN_MESSAGE = re.compile(r"\b(?:error code|status code|status|http)\W{0,3}(\d{3})\b")
+
+
+def provider_limits() -> ProviderLimits:
+    provider = (settings.PROVIDER or "openai").lower()
+    base = PROVIDER_LIMITS.get(provider, PROVIDER_LIMITS["openai"])
+    return ProviderLimits(
+        max_batch=int(settings.EMBED_MAX_BATCH or base.max_batch),
+        tokens_per_minute=int(settings.EMBED_TPM or base.tokens_per_minute),
+        max_concurrency=int(settings.EMBED_CONCURRENCY or base.max_concurrency),
+    )
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate (~4 chars/token) good enough for rate limiting."""
+    return max(1, len(text or "") // 4)
+
+
+def _status_code(err: Exception, msg: str) -> Optional[int]:
+    """HTTP status from the SDK exception (openai: status_code, google: code) or its message."""
+    for attr in ("status_code", "code", "http_status"):
+        code = getattr(err, attr, None)
+        if isinstance(code, int) and 100 <= code < 600:
+            return code
+    m = _STATUS_IN_MESSAGE.search(msg)
+    return int(m.group(1)) if m else None
+
+
+def _error_kind(err: Exception) -> Optional[str]:
+    """SIZE, THROTTLE, or None for errors that retrying cannot fix."""
+    msg = f"{type(err).__name__} {err}".lower()
+    status = _status_code(err, msg)
+    if status in _SIZE_STATUS or any(frag in msg for frag in _SIZE_ERRORS):
+        return SIZE
+    if status in _THROTTLE_STATUS or any(frag in msg for frag in _THROTTLE_ERRORS):
+        return THROTTLE
+    if isinstance(err, (TimeoutError, ConnectionError)):
+        return THROTTLE
+    return None
+
+
+class _TokenBucket:
+    """Tokens-per-minute limiter shared by every batch sent to one provider."""
+
+    def __init__(self, tokens_per_minute: int):
+        self.capacity = max(1, tokens_per_minute)
+        self.rate = self.capacity / 60.0
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self, n: int) -> None:
+        n = min(n, self.capacity)  # an oversized request still gets through once the bucket is full
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= n:
+                    self.tokens -= n
+                    return
+                wait_s = (n - self.tokens) / self.rate
+            time.sleep(min(wait_s, 5.0))
+
+
+_BUCKETS: Dict[Tuple[str, int], _TokenBucket] = {}
+_BUCKETS_LOCK = threading.Lock()
+
+
+def _bucket(limits: ProviderLimits) -> _TokenBucket:
+    key = ((settings.PROVIDER or "openai").lower(), limits.tokens_per_minute)
+    with _BUCKETS_LOCK:
+        if key not in _BUCKETS:
+            _BUCKETS[key] = _TokenBucket(limits.tokens_per_minute)
+        return _BUCKETS[key]
+
+
+# Batch ceilings learned from "payload too large" errors, per model; later batchers start from them
+_LEARNED_CEILINGS: Dict[Tuple[str, str], int] = {}
+_LEARNED_LOCK = threading.Lock()
+
+
+class EmbeddingBatcher:
+    """
+    Embeds a list of texts in provider-sized batches, several in flight at once,
+    under the provider's tokens-per-minute budget.
+
+    Retryable failures halve the batch size and re-queue the failed slice in
+    smaller pieces. "Payload too large" errors also lower the ceiling to the
+    retry size (remembered for later batchers of the same model), and are
+    retried at once; rate-limit / timeout errors
+    are retried with exponential backoff. The batch size only grows back after
+    several successful batches at the current size. Other errors are raised
+    immediately.
+    """
+
+    def __init__(self, embeddings=None, limits: Optional[ProviderLimits] = None,
+                 max_batch: Optional[int] = None, max_retries: Optional[int] = None):
+        self.embeddings = embeddings or get_embeddings()
+        self.limits = limits or provider_limits()
+        self._limit_key = (embedding_model_id(), type(self.embeddings).__name__)
+        with _LEARNED_LOCK:
+            learned = _LEARNED_CEILINGS.get(self._limit_key, self.limits.max_batch)
+        self.ceiling = max(1, min(self.limits.max_batch, learned, int(max_batch or self.limits.max_batch)))
+        self.batch_size = self.ceiling
+        self.max_retries = int(settings.INDEX_BATCH_RETRIES if max_retries is None else max_retries)
+        self._bucket = _bucket(self.limits)
+        self._streak = 0
+        self._resume_at = 0.0   # backoff after throttling applies to every request, once
+
+    def _embed_slice(self, texts: List[str]) -> List[List[float]]:
+        delay = self._resume_at - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+        self._bucket.acquire(sum(estimate_tokens(t) for t in texts))
+        return self.embeddings.embed_documents(texts)
+
+    def _shrink(self, failed_size: int, kind: str) -> None:
+        self._streak = 0
+        if kind == SIZE:
+            # the provider rejected this many inputs: stay at the retry size or below from now on
+            self.ceiling = max(1, min(self.ceiling, failed_size // 2))
+            with _LEARNED_LOCK:
+                key = self._limit_key
+                _LEARNED_CEILINGS[key] = min(_LEARNED_CEILINGS.get(key, self.ceiling), self.ceiling)
+        # min(): slices of the old size failing concurrently must not halve it again and again
+        self.batch_size = max(1, min(self.ceiling, self.batch_size, failed_size // 2))
+
+    def _grow(self, size: int) -> None:
+        if size < self.batch_size:
+            return  # retry fragments and short tail slices say nothing about the current size
+        self._streak += 1
+        if self._streak >= 4 and self.batch_size < self.ceiling:
+            self._streak = 0
+            self.batch_size = min(self.ceiling, self.batch_size + max(1, self.batch_size // 2))
+
+    def embed(self, texts: List[str]) -> Iterator[Tuple[int, List[List[float]]]]:
+        """
+        Yield (offset, vectors) as batches complete (not necessarily in order);
+        vectors[i] belongs to texts[offset + i].
+        """
+        total = len(texts)
+        cursor = 0
+        retry: List[Tuple[int, int, int]] = []   # (start, end, throttle failures)
+        inflight = {}
+
+        with ThreadPoolExecutor(max_workers=max(1, self.limits.max_concurrency)) as pool:
+            while cursor < total or retry or inflight:
+                while len(inflight) < self.limits.max_concurrency and (retry or cursor < total):
+                    if retry:
+                        start, end, failures = retry.pop(0)
+                        if end - start > self.batch_size:
+                            # queued before a later failure lowered the size: split it again
+                            retry.insert(0, (start + self.batch_size, end, failures))
+                            end = start + self.batch_size
+                    else:
+                        start, end, failures = cursor, min(total, cursor + self.batch_size), 0
+                        cursor = end
+                    fut = pool.submit(self._embed_slice, texts[start:end])
+                    inflight[fut] = (start, end, failures)
+
+                done, _ = wait(inflight, return_when=FIRST_COMPLETED)
+                for fut in done:
+                    start, end, failures = inflight.pop(fut)
+                    try:
+                        vectors = fut.result()
+                    except Exception as e:
+                        kind = _error_kind(e)
+                        if kind is None or (kind == SIZE and end - start == 1) \
+                                or (kind == THROTTLE and failures >= self.max_retries):
+                            raise
+                        self._shrink(end - start, kind)
+                        if kind == THROTTLE:
+                            failures += 1
+                            self._resume_at = max(self._resume_at,
+                                                  time.monotonic() + min(30.0, 2.0 ** (failures - 1)))
+                        logger.warning(f"Embedding batch [{start}:{end}] failed ({e}); "
+                                       f"retrying with batch size {self.batch_size}")
+                        step = min(self.batch_size, end - start)
+                        retry.extend((s, min(end, s + step), failures) for s in range(start, end, step))
+                        continue
+                    if len(vectors) != end - start:
+                        raise ValueError(f"Embedding provider returned {len(vectors)} vectors "
+                                         f"for {end - start} inputs")
+                    self._grow(end - start)
+                    yield start, vectors
+
+
+# ---------------------------
+# Query-time micro-batching
+# ---------------------------
+
+def percentile(values: Sequence[float], pct: float) -> float:
+    """Nearest-rank percentile (never below the true value for small samples); 0.0 if empty."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(pct / 100.0 * len(ordered)) - 1)]
+
+
+class CoalescingQueryEmbedder(Embeddings):
+    """
+    Embeddings wrapper that merges concurrent embed_query() calls arriving
+    within max_wait_ms of each other into one batched provider request.
+
+    embed_documents() passes straight through (indexing has its own batcher).
+    """
+
+    def __init__(self, embeddings=None, max_wait_ms: Optional[float] = None, max_batch: Optional[int] = None):
+        self.base = embeddings or get_embeddings()
+        self.max_wait = float(settings.QUERY_EMBED_MAX_WAIT_MS if max_wait_ms is None else max_wait_ms) / 1000.0
+        self.max_batch = max(1, int(max_batch or settings.QUERY_EMBED_MAX_BATCH))
+        self.timeout = float(settings.QUERY_EMBED_TIMEOUT_S)
+        self._queue: "queue.Queue[Tuple[str, Future, float]]" = queue.Queue()
+        self._lock = threading.Lock()
+        self._requests = 0
+        self._batches = 0
+        self._fills: "deque[int]" = deque(maxlen=1024)
+        self._queue_ms: "deque[float]" = deque(maxlen=1024)
+        self._provider_ms: "deque[float]" = deque(maxlen=1024)
+        # batches already collected go out in parallel, bounded by the provider's concurrency
+        self._pool = ThreadPoolExecutor(max_workers=max(1, provider_limits().max_concurrency),
+                                        thread_name_prefix="query-embed")
+        threading.Thread(target=self._loop, name="query-embed-coalescer", daemon=True).start()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.base.embed_documents(texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        fut: Future = Future()
+        self._queue.put((text, fut, time.perf_counter()))
+        try:
+            return fut.result(timeout=self.timeout)
+        except TimeoutError:
+            raise TimeoutError(f"Query embedding not returned within {self.timeout:.0f}s") from None
+
+    def _embed_batch(self, texts: List[str]) -> List[List[float]]:
+        if type(self.base).__name__ == "GoogleGenerativeAIEmbeddings":
+            # keep query-side task type; plain embed_documents would use RETRIEVAL_DOCUMENT
+            return self.base.embed_documents(texts, task_type="RETRIEVAL_QUERY")
+        return self.base.embed_documents(texts)
+
+    def _loop(self) -> None:
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.perf_counter() + self.max_wait
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            try:
+                self._pool.submit(self._flush, batch)
+            except Exception as e:  # pool shut down: fail the callers instead of leaving them waiting
+                self._fail(batch, e)
+
+    @staticmethod
+    def _fail(batch: List[Tuple[str, Future, float]], err: Exception) -> None:
+        for _, fut, _ in batch:
+            if not fut.done():
+                fut.set_exception(err)
+
+    def _flush(self, batch: List[Tuple[str, Future, float]]) -> None:
+        started = time.perf_counter()
+        unique = list(dict.fromkeys(text for text, _, _ in batch))  # identical questions share one slot
+        error: Exception = RuntimeError("Query embedding batch aborted")
+        try:
+            result = self._embed_batch(unique)
+            if len(result) != len(unique):
+                raise ValueError(f"Embedding provider returned {len(result)} vectors for {len(unique)} queries")
+            vectors = dict(zip(unique, result))
+            for text, fut, _ in batch:
+                fut.set_result(vectors[text])
+        except Exception as e:
+            error = e
+            return
+        finally:
+            self._fail(batch, error)  # every caller gets an answer, whatever went wrong
+        finished = time.perf_counter()
+
+        with self._lock:
+            self._requests += len(batch)
+            self._batches += 1
+            self._fills.append(len(batch))
+            self._provider_ms.append((finished - started) * 1000.0)
+            self._queue_ms.extend((started - enq) * 1000.0 for _, _, enq in batch)
+
+    def stats(self) -> Dict[str, Any]:
+        """Batch fill and latency over the most recent batches/requests."""
+        with self._lock:
+            fills, queued, provider = list(self._fills), list(self._queue_ms), list(self._provider_ms)
+            requests, batches = self._requests, self._batches
+        mean_fill = sum(fills) / len(fills) if fills else 0.0
+        return {
+            "requests": requests,
+            "batches": batches,
+            "max_batch": self.max_batch,
+            "max_wait_ms": self.max_wait * 1000.0,
+            "mean_batch_fill": mean_fill,
+            "mean_fill_ratio": mean_fill / self.max_batch,
+            "queue_wait_ms": {"mean": sum(queued) / len(queued) if queued else 0.0,
+                              "p95": percentile(queued, 95)},
+            "provider_ms": {"mean": sum(provider) / len(provider) if provider else 0.0,
+                            "p95": percentile(provider, 95)},
+        }
+
+
+_QUERY_EMBEDDERS: Dict[str, Embeddings] = {}
+_QUERY_EMBEDDER_LOCK = threading.Lock()
+
+
+def get_query_embeddings() -> Embeddings:
+    """
+    Process-wide embedder for questions (one per embedding model id), shared by
+    API requests and all Streamlit sessions; coalesces concurrent calls unless disabled.
+    """
+    key = embedding_model_id()
+    with _QUERY_EMBEDDER_LOCK:
+        if key not in _QUERY_EMBEDDERS:
+            _QUERY_EMBEDDERS[key] = CoalescingQueryEmbedder() if settings.QUERY_EMBED_COALESCE else get_embeddings()
+        return _QUERY_EMBEDDERS[key]
@@ -0,0 +1,297 @@
+# app/evaluation.py
+"""
+Offline retrieval evaluation: recall@k / hit@k / MRR vs. latency over a grid of settings.
+
+Labels are JSONL, one question per line; `page` uses the same (0-based) page
+numbers stored in chunk metadata and shown in the context as `p.N`:
+
+    {"question": "What is the warranty period?", "source": "manual.pdf", "page": 12}
+    {"question": "...", "source": "manual.pdf", "pages": [3, 4]}
+    {"question": "...", "relevant": [{"source": "a.pdf", "page": 1}, {"source": "b.pdf", "page": 7}]}
+
+    python -m app.evaluation --labels qa.jsonl --pdfs data/uploads/*.pdf \\
+        --grid top_k=4,6,8 chunk_size=800,1200 chunk_overlap=100,200 \\
+        --out eval.json --plot pareto.png --min-recall 0.8
+
+Grid keys are Settings fields (case-insensitive). Configurations that share the
+index-time settings (chunking, vector layout) share one index. By default the
+run uses the offline `local` hashing embedder in a temporary LanceDB, so it
+needs no network or API key and never touches the real store.
+"""
+from __future__ import annotations
+
+import argparse
+import csv
+import itertools
+import json
+import statistics
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from loguru import logger
+
+from app.config import Settings, settings
+
+# Settings that change what gets indexed; everything else only affects queries
+INDEX_KEYS = ("CHUNK_SIZE", "CHUNK_OVERLAP", "VECTOR_DIM", "VECTOR_DTYPE", "VECTOR_RESCORE_INT8", "LOCAL_EMBED_DIM")
+
+
+@dataclass
+class Question:
+    text: str
+    relevant: set  # {(source, page)}
+
+
+@dataclass
+class Result:
+    config: Dict[str, Any]
+    recall: float   # mean share of each question's relevant pages found in the top k
+    hit: float      # share of questions with at least one relevant page in the top k
+    mrr: float
+    mean_ms: float
+    p95_ms: float
+    prompt_tokens: float
+    pareto: bool = field(default=False)
+
+
+# ---------------------------
+# Inputs
+# ---------------------------
+
+def load_labels(path: str) -> List[Question]:
+    questions = []
+    with open(path, encoding="utf-8") as f:
+        for n, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            row = json.loads(line)
+            pairs = row.get("relevant")
+            if pairs is None:
+                pages = row.get("pages", [row.get("page")])
+                pairs = [{"source": row["source"], "page": p} for p in pages]
+            relevant = {(p["source"], p.get("page")) for p in pairs}
+            if not row.get("question") or not relevant:
+                raise ValueError(f"{path}:{n}: need a question and at least one source/page")
+            questions.append(Question(row["question"], relevant))
+    return questions
+
+
+def _coerce(name: str, raw: str) -> Any:
+    """Parse a grid value using the Settings field's type."""
+    if raw.lower() in ("none", "null", ""):
+        return None
+    annotation = str(Settings.model_fields[name].annotation)
+    if "bool" in annotation:
+        return raw.lower() in ("1", "true", "yes", "on")
+    if "int" in annotation:
+        return int(raw)
+    if "float" in annotation:
+        return float(raw)
+    return raw
+
+
+def parse_grid(specs: Sequence[str]) -> List[Dict[str, Any]]:
+    """["top_k=4,6", "chunk_size=800"] -> cartesian product of settings overrides."""
+    axes: Dict[str, List[Any]] = {}
+    for spec in specs:
+        key, _, values = spec.partition("=")
+        name = key.strip().upper()
+        if name not in Settings.model_fields:
+            raise ValueError(f"Unknown setting in grid: {key}")
+        axes[name] = [_coerce(name, v.strip()) for v in values.split(",")]
+    if not axes:
+        return [{}]
+    return [dict(zip(axes, combo)) for combo in itertools.product(*axes.values())]
+
+
+@contextmanager
+def override_settings(**overrides: Any) -> Iterator[None]:
+    saved = {k: getattr(settings, k) for k in overrides}
+    for k, v in overrides.items():
+        setattr(settings, k, v)
+    try:
+        yield
+    finally:
+        for k, v in saved.items():
+            setattr(settings, k, v)
+
+
+# ---------------------------
+# Scoring
+# ---------------------------
+
+def _pages(docs: Sequence) -> List[Tuple[Any, Any]]:
+    return [((d.metadata or {}).get("source"), (d.metadata or {}).get("page")) for d in docs]
+
+
+def _first_hit_rank(pages: Sequence[Tuple[Any, Any]], relevant: set) -> Optional[int]:
+    for rank, page in enumerate(pages, 1):
+        if page in relevant:
+            return rank
+    return None
+
+
+def evaluate_config(questions: Sequence[Question], k: int) -> Tuple[float, float, float, List[float], float]:
+    """
+    Run every question through retrieve(); returns recall@k, hit@k, MRR,
+    latencies (ms) and mean prompt tokens.
+    """
+    from app.embeddings import estimate_tokens
+    from app.retriever import format_context, retrieve
+
+    retrieve(questions[0].text, k=k)  # warm connection, table and embedder
+    recall, hits, rr, latencies, tokens = 0.0, 0, 0.0, [], []
+    for q in questions:
+        start = time.perf_counter()
+        docs = retrieve(q.text, k=k)
+        latencies.append((time.perf_counter() - start) * 1000.0)
+        pages = _pages(docs)
+        recall += len(q.relevant & set(pages)) / len(q.relevant)
+        rank = _first_hit_rank(pages, q.relevant)
+        if rank is not None:
+            hits += 1
+            rr += 1.0 / rank
+        tokens.append(estimate_tokens(format_context(docs)))
+    n = len(questions)
+    return recall / n, hits / n, rr / n, latencies, sum(tokens) / n
+
+
+def mark_pareto(results: List[Result]) -> None:
+    """Flag configurations no other configuration beats on both latency and recall."""
+    for r in results:
+        r.pareto = not any(
+            o is not r and o.mean_ms <= r.mean_ms and o.recall >= r.recall
+            and (o.mean_ms < r.mean_ms or o.recall > r.recall)
+            for o in results
+        )
+
+
+def run_grid(pages: Sequence, questions: Sequence[Question], grid: Sequence[Dict[str, Any]],
+             provider: str = "local") -> List[Result]:
+    """Index once per distinct index-time config into a temp LanceDB, then evaluate each config."""
+    from app.chunking import chunk_documents
+    from app.embeddings import percentile
+    from app.vectorstore import index_documents
+
+    builds: Dict[Tuple, List[Dict[str, Any]]] = {}
+    for cfg in grid:
+        builds.setdefault(tuple((k, cfg.get(k)) for k in INDEX_KEYS if k in cfg), []).append(cfg)
+
+    results: List[Result] = []
+    for build, configs in builds.items():
+        with tempfile.TemporaryDirectory(prefix="rag-eval-") as tmp, \
+                override_settings(PROVIDER=provider, LANCE_DIR=tmp, LANCE_TABLE="eval",
+                                  QUERY_EMBED_COALESCE=False, **dict(build)):
+            chunks = chunk_documents([p.model_copy(deep=True) for p in pages])
+            index_documents(chunks)
+            logger.info(f"Indexed {len(chunks)} chunks for {dict(build) or 'defaults'}")
+            for cfg in configs:
+                with override_settings(**cfg):
+                    k = int(settings.TOP_K)
+                    recall, hit, mrr, lat, toks = evaluate_config(questions, k)
+                results.append(Result(
+                    config=cfg, recall=recall, hit=hit, mrr=mrr,
+                    mean_ms=statistics.fmean(lat),
+                    p95_ms=percentile(lat, 95),
+                    prompt_tokens=toks,
+                ))
+    mark_pareto(results)
+    return results
+
+
+# ---------------------------
+# Reporting
+# ---------------------------
+
+def _label(cfg: Dict[str, Any]) -> str:
+    return " ".join(f"{k.lower()}={v}" for k, v in cfg.items()) or "defaults"
+
+
+def print_table(results: Sequence[Result]) -> None:
+    width = max(len(_label(r.config)) for r in results)
+    print(f"{'config':<{width}}  recall@k  hit@k    MRR  mean ms  p95 ms  prompt tok  pareto")
+    for r in sorted(results, key=lambda r: r.mean_ms):
+        print(f"{_label(r.config):<{width}}  {r.recall:8.3f}  {r.hit:5.3f}  {r.mrr:5.3f}  {r.mean_ms:7.2f}  "
+              f"{r.p95_ms:6.2f}  {r.prompt_tokens:10.0f}  {'*' if r.pareto else ''}")
+
+
+def write_csv(results: Sequence[Result], path: str) -> None:
+    keys = sorted({k for r in results for k in r.config})
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        w = csv.writer(f)
+        w.writerow(keys + ["recall", "hit", "mrr", "mean_ms", "p95_ms", "prompt_tokens", "pareto"])
+        for r in results:
+            w.writerow([r.config.get(k) for k in keys]
+                       + [r.recall, r.hit, r.mrr, r.mean_ms, r.p95_ms, r.prompt_tokens, r.pareto])
+
+
+def plot_pareto(results: Sequence[Result], path: str) -> bool:
+    """Latency vs. recall scatter with the Pareto front; needs matplotlib (optional)."""
+    try:
+        import matplotlib
+        matplotlib.use("Agg")
+        import matplotlib.pyplot as plt
+    except ImportError:
+        logger.warning("matplotlib not installed; skipping plot")
+        return False
+    fig, ax = plt.subplots(figsize=(8, 5))
+    ax.scatter([r.mean_ms for r in results], [r.recall for r in results], c="lightgray", label="configs")
+    front = sorted((r for r in results if r.pareto), key=lambda r: r.mean_ms)
+    ax.plot([r.mean_ms for r in front], [r.recall for r in front], "o-", c="tab:blue", label="Pareto front")
+    for r in front:
+        ax.annotate(_label(r.config), (r.mean_ms, r.recall), fontsize=7, xytext=(4, -10), textcoords="offset points")
+    ax.set_xlabel("mean retrieve() latency (ms)")
+    ax.set_ylabel("recall@k")
+    ax.legend()
+    fig.tight_layout()
+    fig.savefig(path, dpi=120)
+    plt.close(fig)
+    return True
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Evaluate retrieval quality vs. latency over a settings grid.")
+    parser.add_argument("--labels", required=True, help="JSONL of question -> source/page labels")
+    parser.add_argument("--pdfs", nargs="+", required=True, help="PDFs to index")
+    parser.add_argument("--grid", nargs="*", default=[], help="setting=v1,v2 ... (e.g. top_k=4,6 chunk_size=800,1200)")
+    parser.add_argument("--provider", default="local",
+                        help="embedding provider (default: offline 'local'; others call the real API)")
+    parser.add_argument("--out", help="write JSON report")
+    parser.add_argument("--csv", help="write CSV report")
+    parser.add_argument("--plot", help="write Pareto plot PNG (requires matplotlib)")
+    parser.add_argument("--min-recall", type=float, help="exit 1 if any configuration's recall@k is lower")
+    parser.add_argument("--min-mrr", type=float, help="exit 1 if any configuration's MRR is lower")
+    args = parser.parse_args(argv)
+
+    from app.loaders import load_pdfs
+
+    questions = load_labels(args.labels)
+    pages = load_pdfs(args.pdfs)
+    if not pages or not questions:
+        parser.error("need at least one parsed PDF page and one labelled question")
+
+    results = run_grid(pages, questions, parse_grid(args.grid), provider=args.provider)
+    print_table(results)
+
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump({"questions": len(questions), "results": [r.__dict__ for r in results]}, f, indent=2)
+    if args.csv:
+        write_csv(results, args.csv)
+    if args.plot:
+        plot_pareto(results, args.plot)
+
+    failed = [r for r in results
+              if (args.min_recall is not None and r.recall < args.min_recall)
+              or (args.min_mrr is not None and r.mrr < args.min_mrr)]
+    for r in failed:
+        print(f"FAIL {_label(r.config)}: recall@k={r.recall:.3f} hit@k={r.hit:.3f} MRR={r.mrr:.3f}", file=sys.stderr)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
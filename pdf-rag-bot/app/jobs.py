@@ -0,0 +1,287 @@
+# app/jobs.py
+from __future__ import annotations
+
+import json
+import queue
+import sqlite3
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from loguru import logger
+
+from app.config import settings
+
+# Job lifecycle: queued -> running -> succeeded | failed | cancelled
+QUEUED, RUNNING, SUCCEEDED, FAILED, CANCELLED = "queued", "running", "succeeded", "failed", "cancelled"
+FINISHED = (SUCCEEDED, FAILED, CANCELLED)
+
+# Error of a job whose PDFs contain no extractable text (retrying cannot help)
+NO_TEXT = "No text extracted from PDFs"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id               TEXT PRIMARY KEY,
+    status           TEXT NOT NULL,
+    payload          TEXT NOT NULL,
+    pages_parsed     INTEGER NOT NULL DEFAULT 0,
+    chunks_total     INTEGER NOT NULL DEFAULT 0,
+    chunks_embedded  INTEGER NOT NULL DEFAULT 0,
+    rows_written     INTEGER NOT NULL DEFAULT 0,
+    attempts         INTEGER NOT NULL DEFAULT 0,
+    cancel_requested INTEGER NOT NULL DEFAULT 0,
+    error            TEXT,
+    owner            TEXT,
+    heartbeat        REAL,
+    created_at       REAL NOT NULL,
+    updated_at       REAL NOT NULL
+)
+"""
+
+# Columns added after the first release; created on older databases at startup
+_MIGRATIONS = {"owner": "TEXT", "heartbeat": "REAL"}
+
+
+class JobCancelled(Exception):
+    """Raised inside a worker when the job's cancel flag has been set."""
+
+
+class JobQueue:
+    """
+    Local, SQLite-backed queue for indexing jobs.
+
+    Job rows survive restarts; worker threads pick up job ids from an
+    in-process queue. Several processes may share one JOBS_DB (Streamlit +
+    uvicorn workers): a worker claims a job atomically before running it and
+    refreshes its heartbeat while it runs. On start, queued jobs and running
+    jobs whose lease (JOB_LEASE_SECONDS) has expired are picked up again.
+    """
+
+    def __init__(self, db_path: Optional[str] = None, workers: Optional[int] = None):
+        self._db_path = db_path or settings.JOBS_DB
+        self._workers = max(1, int(workers or settings.JOB_WORKERS))
+        self._queue: "queue.Queue[str]" = queue.Queue()
+        self._threads: List[threading.Thread] = []
+        self._lock = threading.Lock()
+        self._owner = uuid.uuid4().hex
+        Path(self._db_path).parent.mkdir(parents=True, exist_ok=True)
+        with self._db() as db:
+            db.execute(_SCHEMA)
+            cols = {row["name"] for row in db.execute("PRAGMA table_info(jobs)")}
+            for name, kind in _MIGRATIONS.items():
+                if name not in cols:
+                    db.execute(f"ALTER TABLE jobs ADD COLUMN {name} {kind}")
+
+    # ---------------------------
+    # Storage
+    # ---------------------------
+
+    def _db(self) -> sqlite3.Connection:
+        db = sqlite3.connect(self._db_path, timeout=30)
+        db.row_factory = sqlite3.Row
+        return db
+
+    def _update(self, job_id: str, when: Optional[Dict[str, Any]] = None, **fields: Any) -> bool:
+        """
+        Set fields on a job; with `when` ({column: value or tuple of values}) the
+        row is only changed if it still matches. Returns True if a row changed.
+        """
+        fields["updated_at"] = time.time()
+        cols = ", ".join(f"{k} = ?" for k in fields)
+        conds, args = ["id = ?"], [*fields.values(), job_id]
+        for k, v in (when or {}).items():
+            values = v if isinstance(v, tuple) else (v,)
+            conds.append(f"{k} IN ({', '.join('?' * len(values))})")
+            args.extend(values)
+        with self._db() as db:
+            cur = db.execute(f"UPDATE jobs SET {cols} WHERE {' AND '.join(conds)}", args)
+        return cur.rowcount == 1
+
+    def _progress(self, job_id: str, **fields: Any) -> None:
+        """Progress + heartbeat from the running worker; stops it if cancelled or its lease was lost."""
+        if not self._update(job_id, when={"owner": self._owner, "status": RUNNING}, heartbeat=time.time(), **fields):
+            raise JobCancelled(f"{job_id}: lease lost to another worker")
+        if self._cancel_requested(job_id):
+            raise JobCancelled(job_id)
+
+    def _claim(self, job_id: str) -> bool:
+        """Atomically move a queued job to running for this queue; False if another worker owns it."""
+        now = time.time()
+        with self._db() as db:
+            cur = db.execute(
+                "UPDATE jobs SET status = ?, owner = ?, heartbeat = ?, attempts = attempts + 1, "
+                "pages_parsed = 0, chunks_total = 0, chunks_embedded = 0, rows_written = 0, "
+                "error = NULL, updated_at = ? WHERE id = ? AND status = ? AND cancel_requested = 0",
+                (RUNNING, self._owner, now, now, job_id, QUEUED),
+            )
+        return cur.rowcount == 1
+
+    def _heartbeat(self, job_id: str, stop: threading.Event) -> None:
+        """Keep the lease alive for the whole run, including long parses and throttled batches."""
+        interval = max(0.05, float(settings.JOB_LEASE_SECONDS) / 3)
+        while not stop.wait(interval):
+            try:
+                if not self._update(job_id, when={"owner": self._owner, "status": RUNNING}, heartbeat=time.time()):
+                    return  # lease lost; the next _progress() call stops the worker
+            except sqlite3.Error as e:
+                logger.warning(f"Heartbeat for job {job_id} failed: {e}")
+
+    def _cancel_requested(self, job_id: str) -> bool:
+        with self._db() as db:
+            row = db.execute("SELECT cancel_requested FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return bool(row and row["cancel_requested"])
+
+    # ---------------------------
+    # Public API
+    # ---------------------------
+
+    def start(self) -> None:
+        """Start worker threads (idempotent) and resume unfinished jobs."""
+        with self._lock:
+            if self._threads:
+                return
+            stale = time.time() - float(settings.JOB_LEASE_SECONDS)
+            with self._db() as db:
+                # running jobs whose owner stopped sending heartbeats (crashed / killed process)
+                db.execute(
+                    "UPDATE jobs SET status = ?, owner = NULL WHERE status = ? AND COALESCE(heartbeat, 0) < ?",
+                    (QUEUED, RUNNING, stale),
+                )
+                pending = db.execute(
+                    "SELECT id FROM jobs WHERE status = ? ORDER BY created_at", (QUEUED,)
+                ).fetchall()
+            for row in pending:
+                self._queue.put(row["id"])
+            for i in range(self._workers):
+                t = threading.Thread(target=self._worker, name=f"index-worker-{i}", daemon=True)
+                t.start()
+                self._threads.append(t)
+
+    def submit(self, paths: List[str], corpus_id: Optional[str] = None) -> str:
+        """Queue an indexing job for already-saved PDF paths; returns the job id immediately."""
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        payload = json.dumps({"paths": list(paths), "corpus_id": corpus_id})
+        with self._db() as db:
+            db.execute(
+                "INSERT INTO jobs (id, status, payload, created_at, updated_at) VALUES (?, ?, ?, ?, ?)",
+                (job_id, QUEUED, payload, now, now),
+            )
+        self.start()
+        self._queue.put(job_id)
+        return job_id
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Job status and progress counters, or None if unknown."""
+        with self._db() as db:
+            row = db.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        job = dict(row)
+        job["payload"] = json.loads(job["payload"])
+        job["cancel_requested"] = bool(job["cancel_requested"])
+        return job
+
+    def cancel(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Request cancellation. Queued jobs are cancelled at once; running jobs
+        stop after their current batch. Rows already written are kept.
+        """
+        if not self._update(job_id, when={"status": QUEUED}, status=CANCELLED, cancel_requested=1):
+            self._update(job_id, when={"status": RUNNING}, cancel_requested=1)
+        return self.get(job_id)
+
+    def retry(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Re-queue a failed or cancelled job with the same payload."""
+        if self._update(job_id, when={"status": (FAILED, CANCELLED)},
+                        status=QUEUED, owner=None, cancel_requested=0, error=None):
+            self.start()
+            self._queue.put(job_id)
+        return self.get(job_id)
+
+    # ---------------------------
+    # Worker
+    # ---------------------------
+
+    def _worker(self) -> None:
+        while True:
+            job_id = self._queue.get()
+            try:
+                self._run(job_id)
+            except Exception as e:  # never let a worker thread die
+                logger.exception(e)
+            finally:
+                self._queue.task_done()
+
+    def _run(self, job_id: str) -> None:
+        if not self._claim(job_id):
+            return  # cancelled while queued, finished, or claimed by another worker/process
+        payload = self.get(job_id)["payload"]
+        mine = {"owner": self._owner, "status": RUNNING}  # never overwrite a job another worker took over
+        stop = threading.Event()
+        threading.Thread(target=self._heartbeat, args=(job_id, stop), name=f"job-heartbeat-{job_id[:8]}",
+                         daemon=True).start()
+        try:
+            self._index(job_id, payload["paths"], payload.get("corpus_id"))
+        except JobCancelled as e:
+            logger.info(f"Job {e} stopped")
+            self._update(job_id, when=mine, status=CANCELLED)
+        except Exception as e:
+            logger.exception(e)
+            self._update(job_id, when=mine, status=FAILED, error=str(e))
+        else:
+            self._update(job_id, when=mine, status=SUCCEEDED)
+        finally:
+            stop.set()
+
+    def _index(self, job_id: str, paths: List[str], corpus_id: Optional[str]) -> None:
+        from app.loaders import load_pdfs
+        from app.chunking import chunk_documents
+        from app.vectorstore import index_documents
+
+        docs = load_pdfs(paths)
+        self._progress(job_id, pages_parsed=len(docs))
+
+        chunks = chunk_documents(docs)
+        if corpus_id:
+            for c in chunks:
+                c.metadata = c.metadata or {}
+                c.metadata["corpus_id"] = corpus_id
+        self._progress(job_id, chunks_total=len(chunks))
+        if not chunks:
+            raise ValueError(NO_TEXT)
+
+        def on_progress(embedded: int, written: int) -> None:
+            self._progress(job_id, chunks_embedded=embedded, rows_written=written)
+
+        index_documents(chunks, on_progress=on_progress)
+
+
+def running_jobs(db_path: Optional[str] = None) -> List[str]:
+    """Ids of jobs currently running in any process sharing JOBS_DB (does not start workers)."""
+    path = Path(db_path or settings.JOBS_DB)
+    if not path.exists():
+        return []
+    db = sqlite3.connect(str(path), timeout=30)
+    try:
+        return [row[0] for row in db.execute("SELECT id FROM jobs WHERE status = ?", (RUNNING,))]
+    except sqlite3.OperationalError:  # no jobs table yet
+        return []
+    finally:
+        db.close()
+
+
+_QUEUE: Optional[JobQueue] = None
+_QUEUE_LOCK = threading.Lock()
+
+
+def get_queue() -> JobQueue:
+    """Process-wide job queue, created and started on first use."""
+    global _QUEUE
+    with _QUEUE_LOCK:
+        if _QUEUE is None:
+            _QUEUE = JobQueue()
+            _QUEUE.start()
+        return _QUEUE
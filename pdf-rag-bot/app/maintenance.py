@@ -0,0 +1,41 @@
+# app/maintenance.py
+"""
+Vector table maintenance.
+
+    python -m app.maintenance                 # compact fragments + drop versions older than 7 days
+    python -m app.maintenance --requantize    # also rewrite vectors per VECTOR_DIM / VECTOR_DTYPE / VECTOR_RESCORE_INT8
+    python -m app.maintenance --stats         # report only
+"""
+from __future__ import annotations
+
+import argparse
+import json
+from datetime import timedelta
+
+from app.vectorstore import optimize_store, table_stats
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description="Compact and clean up the LanceDB vector table.")
+    parser.add_argument("--requantize", action="store_true",
+                        help="rewrite vectors into the layout configured in settings")
+    parser.add_argument("--keep-days", type=float, default=7.0,
+                        help="keep table versions newer than this many days (default: 7)")
+    parser.add_argument("--samples", type=int, default=20,
+                        help="probe queries used to measure search latency (default: 20)")
+    parser.add_argument("--stats", action="store_true", help="only print table stats")
+    args = parser.parse_args(argv)
+
+    if args.stats:
+        report = table_stats(args.samples)
+    else:
+        report = optimize_store(
+            requantize=args.requantize,
+            cleanup_older_than=timedelta(days=args.keep_days),
+            latency_samples=args.samples,
+        )
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
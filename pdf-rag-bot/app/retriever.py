@@ -5,7 +5,7 @@ from typing import Any, Dict, List, Optional, Sequence, Union
 from langchain_core.documents import Document
 
 from app.config import settings
-from app.vectorstore import similarity_search
+from app.vectorstore import get_chunks, similarity_search
 
 RawWhere = Union[str, Dict[str, Any], None]
 
@@ -87,6 +87,65 @@ def _with_corpus(filter_str: Optional[str], corpus_id: Optional[str]) -> Optiona
     return _and_all([c for c in [filter_str, clause] if c])
 
 
+# ---------------------------
+# Neighbour expansion
+# ---------------------------
+
+_MIN_OVERLAP = 16  # shorter suffix/prefix matches are treated as coincidence
+
+
+def _join(left: str, right: str) -> str:
+    """Concatenate adjacent chunks, dropping the splitter's overlap when it is found."""
+    for n in range(min(len(left), len(right), settings.CHUNK_OVERLAP * 2), _MIN_OVERLAP - 1, -1):
+        if left.endswith(right[:n]):
+            return left + right[n:]
+    return left + "\n" + right
+
+
+def _expand_neighbors(hits: List[Document], radius: int) -> List[Document]:
+    """
+    Widen each hit with up to `radius` chunks on either side from the same page,
+    following the prev_id/next_id links stored at index time. Neighbours are
+    fetched by id, one batched lookup per step; hits absorbed into a
+    higher-ranked hit's window are dropped.
+    """
+    known: Dict[str, Document] = {d.id: d for d in hits if d.id}
+    frontier = [(d, key) for d in hits for key in ("prev_id", "next_id")]
+    for _ in range(radius):
+        wanted = {(d.metadata or {}).get(key) for d, key in frontier} - set(known) - {None, ""}
+        known.update(get_chunks(wanted))
+        frontier = [(known[(d.metadata or {}).get(key)], key) for d, key in frontier
+                    if (d.metadata or {}).get(key) in known]
+
+    out: List[Document] = []
+    covered: set = set()
+    for hit in hits:
+        if hit.id and hit.id in covered:
+            continue
+        before: List[Document] = []
+        after: List[Document] = []
+        for key, side in (("prev_id", before), ("next_id", after)):
+            d = hit
+            for _ in range(radius):
+                nid = (d.metadata or {}).get(key)
+                if not nid or nid in covered or nid not in known:
+                    break
+                d = known[nid]
+                side.append(d)
+        window = before[::-1] + [hit] + after
+        covered.update(d.id for d in window if d.id)
+        if len(window) == 1:
+            out.append(hit)
+            continue
+        text = window[0].page_content or ""
+        for d in window[1:]:
+            text = _join(text, d.page_content or "")
+        md = dict(hit.metadata or {})
+        md["neighbors"] = len(window) - 1
+        out.append(Document(id=hit.id, page_content=text, metadata=md))
+    return out
+
+
 # ---------------------------
 # Public API
 # ---------------------------
@@ -96,12 +155,15 @@ def retrieve(
     where: RawWhere = None,
     k: Optional[int] = None,
     corpus_id: Optional[str] = None,
+    expand: Optional[int] = None,
 ) -> List[Document]:
     """
     Similarity search with optional filename and corpus scoping.
 
     - where: None | raw string | {"source": "file.pdf"} | {"source": ["a.pdf","b.pdf"]}
     - corpus_id: if provided, restricts hits to the current indexing session
+    - expand: adjacent chunks (per side, same page) merged into each hit;
+      defaults to settings.NEIGHBOR_EXPAND. Uses id lookups, not extra searches.
     """
     query = (query or "").strip()
     if not query:
@@ -112,9 +174,11 @@ def retrieve(
     base = _normalize_where(where)
     filt = _with_corpus(base, corpus_id)
 
+    radius = int(settings.NEIGHBOR_EXPAND if expand is None else expand)
+
     # Run the query; if the table schema lacks metadata['corpus_id'], avoid crashing.
     try:
-        return similarity_search(query, k=top_k, where=filt)
+        docs = similarity_search(query, k=top_k, where=filt)
     except Exception as e:
         msg = str(e)
         # If schema doesn't have corpus_id, return no docs (honours "limit to current corpus")
@@ -122,6 +186,7 @@ def retrieve(
             return []
         # Otherwise, bubble up the error for visibility
         raise
+    return _expand_neighbors(docs, radius) if radius > 0 and docs else docs
 
 def format_context(docs: List[Document]) -> str:
     """Readable context block for the LLM, including source markers."""
@@ -0,0 +1,246 @@
+# app/snapshot.py
+"""
+Portable corpus snapshots for fast cold starts.
+
+A snapshot is a tar archive (or the same layout as a plain directory):
+
+    manifest.json        format version, embedding model id, chunk settings,
+                         vector layout, corpus catalog, file sizes + sha256
+    lance/<table>.lance  the Lance table directory as-is (data, versions, indexes)
+
+    python -m app.snapshot export corpus.tar [--optimize]
+    python -m app.snapshot import corpus.tar [--replace] [--no-verify]
+    python -m app.snapshot inspect corpus.tar
+
+Import refuses snapshots built with a different embedding model than the one
+configured in settings, since their vectors are not comparable.
+"""
+from __future__ import annotations
+
+import argparse
+import hashlib
+import io
+import json
+import os
+import shutil
+import tarfile
+import time
+import uuid
+from datetime import timedelta
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from loguru import logger
+
+from app.config import settings
+from app.embeddings import embedding_model_id
+from app.vectorstore import corpus_catalog, optimize_store, table_path, table_stats
+
+SNAPSHOT_FORMAT = 1
+MANIFEST = "manifest.json"
+
+
+class SnapshotError(Exception):
+    """Snapshot is malformed, corrupted or incompatible with the current settings."""
+
+
+def _sha256(path: Path) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+# ---------------------------
+# Export
+# ---------------------------
+
+def export_snapshot(out_path: str, optimize: bool = False) -> Dict[str, Any]:
+    """
+    Write the current table plus manifest to out_path (.tar, or .tar.gz for a
+    smaller but slower archive). optimize=True compacts the table first so the
+    snapshot carries a single version. Returns the manifest.
+    """
+    src = table_path()
+    if not src.exists():
+        raise SnapshotError("Nothing to export: the vector table does not exist")
+    if optimize:
+        optimize_store(cleanup_older_than=timedelta(0), latency_samples=0)
+
+    stats = table_stats(latency_samples=0)
+    prefix = Path("lance") / src.name
+    files = {}
+    for f in sorted(p for p in src.rglob("*") if p.is_file()):
+        rel = (prefix / f.relative_to(src)).as_posix()
+        files[rel] = {"size": f.stat().st_size, "sha256": _sha256(f)}
+
+    manifest = {
+        "format": SNAPSHOT_FORMAT,
+        "created_at": time.time(),
+        "table": src.name[: -len(".lance")],
+        "rows": stats["rows"],
+        "embedding": {"model_id": embedding_model_id(), "dim": stats["layout"]["full_dim"]},
+        "chunking": {"chunk_size": settings.CHUNK_SIZE, "chunk_overlap": settings.CHUNK_OVERLAP},
+        "layout": stats["layout"],
+        "catalog": corpus_catalog(),
+        "files": files,
+    }
+
+    out = Path(out_path)
+    out.parent.mkdir(parents=True, exist_ok=True)
+    mode = "w:gz" if out.name.endswith((".tar.gz", ".tgz")) else "w"
+    with tarfile.open(out, mode) as tar:
+        # manifest goes first so import can validate before touching any data
+        blob = json.dumps(manifest, indent=2).encode("utf-8")
+        info = tarfile.TarInfo(MANIFEST)
+        info.size = len(blob)
+        info.mtime = int(manifest["created_at"])
+        tar.addfile(info, io.BytesIO(blob))
+        for rel in files:
+            tar.add(src / Path(rel).relative_to(prefix), arcname=rel, recursive=False)
+    logger.info(f"Exported {manifest['rows']} rows to {out}")
+    return manifest
+
+
+# ---------------------------
+# Import
+# ---------------------------
+
+def read_manifest(path: str) -> Dict[str, Any]:
+    """Manifest of a snapshot archive or directory, without extracting data."""
+    p = Path(path)
+    try:
+        if p.is_dir():
+            return json.loads((p / MANIFEST).read_text(encoding="utf-8"))
+        with tarfile.open(p, "r:*") as tar:
+            first = tar.next()
+            if first is None or first.name != MANIFEST:
+                raise SnapshotError(f"{path}: {MANIFEST} must be the first archive member")
+            return json.load(tar.extractfile(first))
+    except (OSError, tarfile.TarError, json.JSONDecodeError) as e:
+        raise SnapshotError(f"{path}: unreadable snapshot ({e})") from e
+
+
+def check_compatible(manifest: Dict[str, Any]) -> None:
+    """Raise SnapshotError unless the snapshot can be served with the current settings."""
+    if manifest.get("format") != SNAPSHOT_FORMAT:
+        raise SnapshotError(f"Unsupported snapshot format {manifest.get('format')!r} (expected {SNAPSHOT_FORMAT})")
+    want = embedding_model_id()
+    got = (manifest.get("embedding") or {}).get("model_id")
+    if got != want:
+        raise SnapshotError(f"Snapshot was embedded with {got!r} but settings use {want!r}")
+    table = manifest.get("table")
+    if not isinstance(table, str) or not table or Path(table).is_absolute() \
+            or Path(table).name != table or table in (".", ".."):
+        raise SnapshotError(f"Invalid table name in snapshot: {table!r}")
+    for rel in manifest.get("files") or {}:
+        parts = Path(rel).parts
+        if Path(rel).is_absolute() or ".." in parts or parts[:2] != ("lance", f"{table}.lance"):
+            raise SnapshotError(f"Snapshot lists a file outside lance/{table}.lance/: {rel}")
+    chunking = manifest.get("chunking") or {}
+    if (chunking.get("chunk_size"), chunking.get("chunk_overlap")) != (settings.CHUNK_SIZE, settings.CHUNK_OVERLAP):
+        logger.warning(f"Snapshot chunking {chunking} differs from settings; new uploads will be chunked differently")
+
+
+def _link_or_copy(src: Path, dst: Path) -> None:
+    dst.parent.mkdir(parents=True, exist_ok=True)
+    try:
+        os.link(src, dst)  # same filesystem: no data is copied
+    except OSError:
+        shutil.copy2(src, dst)
+
+
+def _verify(root: Path, manifest: Dict[str, Any]) -> None:
+    for rel, meta in manifest["files"].items():
+        f = root / rel
+        if not f.is_file() or f.stat().st_size != meta["size"]:
+            raise SnapshotError(f"Snapshot file missing or truncated: {rel}")
+        if _sha256(f) != meta["sha256"]:
+            raise SnapshotError(f"Checksum mismatch: {rel}")
+
+
+def import_snapshot(path: str, replace: bool = False, verify: bool = True) -> Dict[str, Any]:
+    """
+    Install a snapshot as the current table. Data is staged next to LANCE_DIR,
+    verified against the manifest, then renamed into place. Directory snapshots
+    are hard-linked when possible (Lance never rewrites files in place).
+    Returns the manifest.
+    """
+    manifest = read_manifest(path)
+    check_compatible(manifest)
+
+    dest = table_path()
+    if dest.exists() and not replace:
+        raise SnapshotError(f"Table {dest.name} already exists; pass replace=True to overwrite it")
+
+    staging = dest.parent / f".import-{uuid.uuid4().hex}"
+    try:
+        src = Path(path)
+        if src.is_dir():
+            for rel in manifest["files"]:
+                _link_or_copy(src / rel, staging / rel)
+        else:
+            with tarfile.open(src, "r:*") as tar:
+                members = [m for m in tar.getmembers() if m.name in manifest["files"]]
+                tar.extractall(staging, members=members, filter="data")
+        if verify:
+            _verify(staging, manifest)
+
+        table_dir = staging / "lance" / f"{manifest['table']}.lance"
+        backup = dest.parent / f".replaced-{uuid.uuid4().hex}"
+        if dest.exists():
+            dest.rename(backup)
+        try:
+            table_dir.rename(dest)
+        except BaseException:
+            if backup.exists():
+                backup.rename(dest)  # never leave the node without a table
+            raise
+        shutil.rmtree(backup, ignore_errors=True)
+    except (OSError, tarfile.TarError) as e:
+        # truncated/corrupt archive, missing files, full disk...: one error type for callers
+        raise SnapshotError(f"{path}: import failed ({e})") from e
+    finally:
+        shutil.rmtree(staging, ignore_errors=True)
+
+    logger.info(f"Imported snapshot {path}: {manifest.get('rows')} rows into {dest}")
+    return manifest
+
+
+def restore_on_startup() -> Optional[Dict[str, Any]]:
+    """Import settings.SNAPSHOT_PATH if configured and no table exists yet; safe to call repeatedly."""
+    if not settings.SNAPSHOT_PATH or table_path().exists():
+        return None
+    try:
+        return import_snapshot(settings.SNAPSHOT_PATH)
+    except SnapshotError as e:
+        logger.error(f"Snapshot not loaded: {e}")
+        return None
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description="Export / import a corpus snapshot.")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    p_exp = sub.add_parser("export", help="write the current table to an archive")
+    p_exp.add_argument("path")
+    p_exp.add_argument("--optimize", action="store_true", help="compact and drop old versions first")
+    p_imp = sub.add_parser("import", help="install an archive or snapshot directory")
+    p_imp.add_argument("path")
+    p_imp.add_argument("--replace", action="store_true", help="overwrite an existing table")
+    p_imp.add_argument("--no-verify", action="store_true", help="skip checksum verification")
+    p_ins = sub.add_parser("inspect", help="print the manifest")
+    p_ins.add_argument("path")
+    args = parser.parse_args(argv)
+
+    if args.cmd == "export":
+        manifest = export_snapshot(args.path, optimize=args.optimize)
+    elif args.cmd == "import":
+        manifest = import_snapshot(args.path, replace=args.replace, verify=not args.no_verify)
+    else:
+        manifest = read_manifest(args.path)
+    print(json.dumps({k: v for k, v in manifest.items() if k != "files"}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
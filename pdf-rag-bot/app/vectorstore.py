@@ -1,10 +1,18 @@
 from __future__ import annotations
+import hashlib
+import threading
+import time
+from dataclasses import dataclass
+from datetime import timedelta
 from pathlib import Path
-from typing import Sequence, Dict, Any, Optional, List, Iterable
+from typing import Sequence, Dict, Any, Optional, List, Iterable, Callable
 
-import lancedb
-from langchain_community.vectorstores import LanceDB as LC_LanceDB
-from app.embeddings import get_embeddings
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+from loguru import logger
+from langchain_core.documents import Document
+from app.embeddings import EmbeddingBatcher, get_query_embeddings, percentile
 from app.config import settings
 
 
@@ -19,8 +27,26 @@ def _table_name() -> str:
     return getattr(settings, "LANCE_TABLE", "pdf_rag")
 
 
+_CONNECTIONS: Dict[str, Any] = {}
+_CONN_LOCK = threading.Lock()
+
+
 def _conn():
-    return lancedb.connect(_db_path())
+    """One LanceDB connection per database path, shared by every caller in the process."""
+    import lancedb  # deferred: heavy, and only needed once the store is actually touched
+    path = _db_path()
+    with _CONN_LOCK:
+        if path not in _CONNECTIONS:
+            _CONNECTIONS[path] = lancedb.connect(path)
+        return _CONNECTIONS[path]
+
+
+# Serialises table writes within the process (indexing batches vs. requantize rewrites)
+_WRITE_LOCK = threading.RLock()
+
+
+class StoreBusy(RuntimeError):
+    """A maintenance rewrite was refused because indexing is in progress."""
 
 
 def _table_exists(conn, table_name: str) -> bool:
@@ -30,26 +56,8 @@ def _table_exists(conn, table_name: str) -> bool:
         return False
 
 
-def get_store() -> LC_LanceDB:
-    """Open the LanceDB vector store (assumes table already exists)."""
-    conn = _conn()
-    table = _table_name()
-    return LC_LanceDB(
-        connection=conn,
-        table_name=table,
-        embedding=get_embeddings(),
-    )
-
-
-def index_documents(docs: Sequence):
-    """
-    If table doesn't exist, create it with from_documents (infers schema).
-    Otherwise, append with add_documents.
-    """
-    if not docs:
-        return  # nothing to index; avoid accidental empty table creation
-
-    # Ensure required metadata keys exist so list_sources() / filters work
+def _normalize_metadata(docs: Sequence) -> None:
+    """Ensure required metadata keys exist so list_sources() / filters work."""
     for d in docs:
         d.metadata = d.metadata or {}
         # Normalize filename
@@ -60,30 +68,333 @@ def index_documents(docs: Sequence):
             d.metadata["source"] = "unknown"
         d.metadata.setdefault("page", d.metadata.get("page", 0))
         d.metadata.setdefault("section", d.metadata.get("section", ""))
+        # Keep the struct schema stable across appends (API uploads carry no corpus)
+        d.metadata.setdefault("corpus_id", "")
+
+
+def _chunk_ids(docs: Sequence) -> List[str]:
+    """
+    Deterministic ids (corpus, source, page, text, occurrence) so re-running the
+    same upload can skip chunks that were already written.
+    """
+    seen: Dict[str, int] = {}
+    ids = []
+    for d in docs:
+        md = d.metadata
+        key = "\x1f".join(str(x) for x in (md.get("corpus_id"), md.get("source"), md.get("page"), d.page_content))
+        digest = hashlib.sha1(key.encode("utf-8")).hexdigest()
+        n = seen.get(digest, 0)
+        seen[digest] = n + 1
+        ids.append(digest if n == 0 else f"{digest}-{n}")
+    return ids
+
+
+def _link_neighbors(docs: Sequence, ids: Sequence[str]) -> None:
+    """
+    Record each chunk's ordinal and prev/next chunk ids within its (corpus, source,
+    page) sequence, so retrieval can widen a hit by primary-key lookup. Missing
+    links are "" rather than None to keep the metadata struct schema stable.
+    """
+    runs: Dict[tuple, List[int]] = {}
+    for i, d in enumerate(docs):
+        md = d.metadata
+        runs.setdefault((md.get("corpus_id"), md.get("source"), md.get("page")), []).append(i)
+    for run in runs.values():
+        for n, i in enumerate(run):
+            md = docs[i].metadata
+            md["chunk_index"] = n
+            md["prev_id"] = ids[run[n - 1]] if n > 0 else ""
+            md["next_id"] = ids[run[n + 1]] if n + 1 < len(run) else ""
+
+
+def _existing_ids(conn, table_name: str) -> set[str]:
+    """Ids already in the table (the resume checkpoint)."""
+    if not _table_exists(conn, table_name):
+        return set()
+    ds = conn.open_table(table_name).to_lance()
+    return set(ds.to_table(columns=["id"]).column("id").to_pylist())
+
+
+def _update_id_index(tbl) -> None:
+    """
+    BTREE index on `id` for neighbour fetches (get_chunks): built if missing, otherwise
+    extended to fragments appended since (incremental; unindexed fragments are scanned).
+    """
+    try:
+        with _WRITE_LOCK:
+            ds = tbl.to_lance()
+            if any(ix["fields"] == ["id"] for ix in ds.list_indices()):
+                ds.optimize.optimize_indices()
+            else:
+                tbl.create_scalar_index("id")
+    except Exception as e:
+        logger.warning(f"Could not update the id index: {e}")
+
+
+# ---------------------------
+# Vector layout
+# ---------------------------
+
+@dataclass(frozen=True)
+class VectorLayout:
+    """
+    How vectors are stored: the searchable `vector` column (dims + dtype) and,
+    optionally, full-dimension int8 codes used to re-rank the candidates of a
+    compact search column. Compact layouts are lossy: the original float32
+    vectors are not kept, and the int8 codes only approximate them.
+    """
+    full_dim: int
+    dim: int
+    dtype: str = "float32"   # float32 | float16
+    rescore: bool = False    # store vector_int8 + vector_scale
+
+    @property
+    def compact(self) -> bool:
+        return self.dim < self.full_dim or self.dtype != "float32"
+
+
+def _target_layout(full_dim: int) -> VectorLayout:
+    """Layout requested by settings for vectors of the given dimension."""
+    dim = min(int(settings.VECTOR_DIM or full_dim), full_dim)
+    dtype = (settings.VECTOR_DTYPE or "float32").lower()
+    if dtype not in ("float32", "float16"):
+        raise ValueError(f"Unsupported VECTOR_DTYPE: {dtype}")
+    layout = VectorLayout(full_dim=full_dim, dim=dim, dtype=dtype, rescore=bool(settings.VECTOR_RESCORE_INT8))
+    if layout.rescore and not layout.compact:
+        # the search column is already exact: int8 codes would only add size and re-rank with less precision
+        logger.warning("VECTOR_RESCORE_INT8 ignored: it needs VECTOR_DIM < embedding dim or VECTOR_DTYPE=float16")
+        layout = VectorLayout(full_dim=full_dim, dim=dim, dtype=dtype)
+    return layout
+
+
+def _table_layout(schema: pa.Schema) -> VectorLayout:
+    """Layout an existing table was written with (appends and searches follow the table)."""
+    vec = schema.field("vector").type
+    dtype = "float16" if vec.value_type == pa.float16() else "float32"
+    if "vector_int8" in schema.names:
+        full = schema.field("vector_int8").type.list_size
+        return VectorLayout(full_dim=full, dim=vec.list_size, dtype=dtype, rescore=True)
+    return VectorLayout(full_dim=vec.list_size, dim=vec.list_size, dtype=dtype)
+
+
+def _coarse(full: np.ndarray, layout: VectorLayout) -> np.ndarray:
+    """Searchable form: truncated to layout.dim (re-normalised) and cast to layout.dtype."""
+    out = full[:, :layout.dim]
+    if layout.dim < layout.full_dim:
+        norms = np.linalg.norm(out, axis=1, keepdims=True)
+        out = out / np.where(norms == 0, 1.0, norms)
+    return out.astype(np.float16 if layout.dtype == "float16" else np.float32)
+
+
+def _quantize(full: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """Symmetric per-vector int8 codes and their float32 scales."""
+    scale = np.abs(full).max(axis=1) / 127.0
+    scale = np.where(scale == 0, 1.0, scale).astype(np.float32)
+    codes = np.clip(np.rint(full / scale[:, None]), -127, 127).astype(np.int8)
+    return codes, scale
+
+
+def _dequantize(codes: Any, scale: Any) -> np.ndarray:
+    return np.asarray(codes, dtype=np.float32) * np.asarray(scale, dtype=np.float32).reshape(-1, 1)
+
+
+def _fixed_list(values: np.ndarray) -> pa.FixedSizeListArray:
+    return pa.FixedSizeListArray.from_arrays(pa.array(values.ravel()), values.shape[1])
+
+
+def _vector_columns(full: np.ndarray, layout: VectorLayout) -> Dict[str, pa.Array]:
+    cols: Dict[str, pa.Array] = {"vector": _fixed_list(_coarse(full, layout))}
+    if layout.rescore:
+        codes, scale = _quantize(full)
+        cols["vector_int8"] = _fixed_list(codes)
+        cols["vector_scale"] = pa.array(scale)
+    return cols
+
+
+def _to_table(docs: Sequence, ids: Sequence[str], vectors: List[List[float]],
+              layout: VectorLayout, schema: Optional[pa.Schema] = None) -> pa.Table:
+    """Rows in the shape LangChain's LanceDB wrapper reads (id/text/metadata/vector)."""
+    full = np.asarray(vectors, dtype=np.float32)
+    if full.shape[1] != layout.full_dim:
+        raise ValueError(f"Embedding dimension {full.shape[1]} does not match the table ({layout.full_dim}); "
+                         "the embedding model changed - reset the store and re-index")
+    rows = [{"id": id_, "text": d.page_content, "metadata": d.metadata} for d, id_ in zip(docs, ids)]
+    # Conform to the existing schema: missing metadata keys become null, extras are dropped
+    base_schema = pa.schema([schema.field(n) for n in ("id", "text", "metadata")]) if schema else None
+    data = pa.Table.from_pylist(rows, schema=base_schema)
+    for name, arr in _vector_columns(full, layout).items():
+        data = data.append_column(name, arr)
+    return data.select(schema.names).cast(schema) if schema else data
+
+
+def _write_rows(conn, table_name: str, docs: Sequence, ids: Sequence[str], vectors: List[List[float]]) -> None:
+    """
+    Create the table from the first batch (layout from settings), insert afterwards.
+    Inserts are keyed on id, so an overlapping run (e.g. another process that
+    resumed the same job) cannot duplicate rows.
+    """
+    with _WRITE_LOCK:
+        if not _table_exists(conn, table_name):
+            layout = _target_layout(len(vectors[0]))
+            try:
+                conn.create_table(table_name, data=_to_table(docs, ids, vectors, layout))
+                return
+            except (OSError, ValueError):
+                if not _table_exists(conn, table_name):
+                    raise
+                # another writer created it first: fall through and insert by id
+        tbl = conn.open_table(table_name)
+        data = _to_table(docs, ids, vectors, _table_layout(tbl.schema), schema=tbl.schema)
+        tbl.merge_insert("id").when_not_matched_insert_all().execute(data)
+
+
+def index_documents(
+    docs: Sequence,
+    batch_size: Optional[int] = None,
+    on_progress: Optional[Callable[[int, int], None]] = None,
+) -> int:
+    """
+    Embed docs through the provider-aware EmbeddingBatcher and write each batch
+    as it completes; the first batch creates the table (infers schema), later
+    batches append. Chunks already present (same deterministic id) are skipped,
+    so re-running a failed upload resumes where it stopped.
+    Returns the number of rows written by this call.
+
+    - each chunk's metadata gets chunk_index / prev_id / next_id (see _link_neighbors)
+    - on_progress(chunks_embedded, rows_written) is called after every batch
+      (counts include skipped chunks); raising from it aborts indexing.
+    """
+    if not docs:
+        return 0  # nothing to index; avoid accidental empty table creation
+
+    _normalize_metadata(docs)
 
     conn = _conn()
     table = _table_name()
-    emb = get_embeddings()
-
-    if not _table_exists(conn, table):
-        # First time: create table and insert docs in one go
-        LC_LanceDB.from_documents(
-            docs,
-            emb,
-            connection=conn,
-            table_name=table,
-        )
-    else:
-        vs = LC_LanceDB(connection=conn, table_name=table, embedding=emb)
-        vs.add_documents(docs)
+    ids = _chunk_ids(docs)
+    _link_neighbors(docs, ids)
+
+    done = _existing_ids(conn, table)
+    todo = [i for i, id_ in enumerate(ids) if id_ not in done]
+    skipped = len(docs) - len(todo)
+    if skipped:
+        logger.info(f"Resuming: {skipped}/{len(docs)} chunks already indexed")
+        if on_progress:
+            on_progress(skipped, skipped)
+    if not todo:
+        return 0
+
+    batcher = EmbeddingBatcher(max_batch=batch_size or settings.INDEX_BATCH_SIZE)
+    embedded = written = 0
+    for offset, vectors in batcher.embed([docs[i].page_content for i in todo]):
+        idx = todo[offset:offset + len(vectors)]
+        embedded += len(idx)
+        _write_rows(conn, table, [docs[i] for i in idx], [ids[i] for i in idx], vectors)
+        written += len(idx)
+        if on_progress:
+            on_progress(skipped + embedded, skipped + written)
+    if written:
+        _update_id_index(conn.open_table(table))
+    return written
+
+
+def _search_vector(tbl, full_query: np.ndarray, k: int, where: Optional[str] = None,
+                   layout: Optional[VectorLayout] = None) -> List[Dict[str, Any]]:
+    """
+    k nearest rows for a float32 query. Compact layouts search the coarse column
+    with oversampling and, when int8 codes are stored, re-score in float32.
+    """
+    layout = layout or _table_layout(tbl.schema)
+    query = _coarse(full_query.reshape(1, -1), layout)[0].astype(np.float32)
+    rescore = layout.rescore and layout.compact  # an exact float32 column is never re-ranked with int8 codes
+    limit = k * max(1, int(settings.RESCORE_OVERSAMPLE)) if rescore else k
+    columns = ["id", "text", "metadata"] + (["vector_int8", "vector_scale"] if rescore else [])
+
+    q = tbl.search(query.tolist(), vector_column_name="vector").limit(limit).select(columns)
+    if where:
+        q = q.where(where, prefilter=True)
+    rows = q.to_list()
+
+    if rescore and rows:
+        full = _dequantize([r["vector_int8"] for r in rows], [r["vector_scale"] for r in rows])
+        dist = ((full - full_query.reshape(1, -1)) ** 2).sum(axis=1)
+        rows = [rows[i] for i in np.argsort(dist, kind="stable")]
+    return rows[:k]
 
 
 def similarity_search(query: str, k: int, where: Optional[Dict[str, Any]] = None):
     """
-    Run similarity search with optional metadata filter.
+    Run similarity search with optional metadata filter (applied before the
+    vector search, so filtered queries still return up to k hits).
+    """
+    conn = _conn()
+    table_name = _table_name()
+    if not _table_exists(conn, table_name):
+        return []
+    tbl = conn.open_table(table_name)
+    full_query = np.asarray(get_query_embeddings().embed_query(query), dtype=np.float32)
+    rows = _search_vector(tbl, full_query, k, where)
+    return [Document(id=r["id"], page_content=r["text"], metadata=r["metadata"]) for r in rows]
+
+
+def get_chunks(ids: Iterable[str]) -> Dict[str, Document]:
+    """Chunks by primary key (no vector search); unknown ids are simply absent."""
+    ids = sorted({i for i in ids if i})
+    conn = _conn()
+    table_name = _table_name()
+    if not ids or not _table_exists(conn, table_name):
+        return {}
+    tbl = conn.open_table(table_name)
+    in_list = ", ".join("'" + i.replace("'", "''") + "'" for i in ids)
+    rows = (tbl.search().where(f"id IN ({in_list})")
+            .limit(len(ids)).select(["id", "text", "metadata"]).to_list())
+    return {r["id"]: Document(id=r["id"], page_content=r["text"], metadata=r["metadata"]) for r in rows}
+
+
+def table_path() -> Path:
+    """On-disk directory of the Lance table (may not exist yet)."""
+    return Path(_db_path()) / f"{_table_name()}.lance"
+
+
+def table_version() -> str:
+    """
+    Token that changes with every commit to the table, including a drop and re-create
+    (which restarts the version counter). "" when there is no table.
+    """
+    conn = _conn()
+    table_name = _table_name()
+    if not _table_exists(conn, table_name):
+        return ""
+    version = conn.open_table(table_name).version
+    try:
+        stamp = (table_path() / "_versions" / f"{version}.manifest").stat().st_mtime_ns
+    except OSError:
+        stamp = 0
+    return f"{version}:{stamp}"
+
+
+def corpus_catalog() -> Dict[str, Any]:
+    """
+    Per-corpus summary of what is indexed: {corpus_id: {source: {"chunks": n, "pages": m}}}.
+    Rows without a corpus (API uploads) are grouped under "".
     """
-    vs = get_store()
-    return vs.similarity_search(query, k=k, filter=where)
+    conn = _conn()
+    table_name = _table_name()
+    if not _table_exists(conn, table_name):
+        return {}
+    catalog: Dict[str, Dict[str, Dict[str, Any]]] = {}
+    pages: Dict[tuple, set] = {}
+    data = conn.open_table(table_name).to_lance().to_table(columns=["metadata"])
+    for md in data.column("metadata").to_pylist():
+        md = md or {}
+        corpus = md.get("corpus_id") or ""
+        src = md.get("source") or "unknown"
+        entry = catalog.setdefault(corpus, {}).setdefault(src, {"chunks": 0, "pages": 0})
+        entry["chunks"] += 1
+        pages.setdefault((corpus, src), set()).add(md.get("page"))
+    for (corpus, src), seen in pages.items():
+        catalog[corpus][src]["pages"] = len(seen)
+    return catalog
 
 
 def list_sources(corpus_id: Optional[str] = None) -> list[str]:
@@ -91,50 +402,14 @@ def list_sources(corpus_id: Optional[str] = None) -> list[str]:
     Returns a sorted list of distinct metadata['source'] values in the LanceDB table.
     If corpus_id is provided, only returns sources belonging to that corpus.
     Safe if the table doesn't exist (returns []).
-    Handles both flattened ('metadata.source') and struct ('metadata': {...}) shapes.
     """
     try:
-        conn = _conn()
-        table_name = _table_name()
-        if not _table_exists(conn, table_name):
-            return []
-        tbl = conn.open_table(table_name)
-
-        sources = set()
-
-        # Prefer flattened columns (newer Lance/Arrow)
-        try:
-            for batch in tbl.to_batches(columns=["metadata.source", "metadata.corpus_id"]):
-                rows = batch.to_pylist()
-                for row in rows:
-                    src = row.get("metadata.source")
-                    corp = row.get("metadata.corpus_id")
-                    if corpus_id and corp != corpus_id:
-                        continue
-                    if src:
-                        sources.add(src)
-        except Exception:
-            # Fallback to older struct shape
-            for batch in tbl.to_batches(columns=["metadata"]):
-                rows = batch.to_pylist()
-                for row in rows:
-                    if isinstance(row, dict) and "metadata" in row and isinstance(row["metadata"], dict):
-                        md = row["metadata"]
-                    elif isinstance(row, dict):
-                        md = row
-                    else:
-                        md = None
-                    if not isinstance(md, dict):
-                        continue
-                    if corpus_id and md.get("corpus_id") != corpus_id:
-                        continue
-                    src = md.get("source")
-                    if src:
-                        sources.add(src)
-
-        return sorted(sources)
+        catalog = corpus_catalog()
     except Exception:
         return []
+    if corpus_id:
+        return sorted(catalog.get(corpus_id, {}))
+    return sorted({src for sources in catalog.values() for src in sources})
 
 
 def reset_store() -> bool:
@@ -149,3 +424,149 @@ def reset_store() -> bool:
         return True
     except Exception:
         return False
+
+
+# ---------------------------
+# Maintenance
+# ---------------------------
+
+def _dir_size(path: Path) -> int:
+    return sum(f.stat().st_size for f in path.rglob("*") if f.is_file()) if path.exists() else 0
+
+
+def _probe_latency(tbl, samples: int, k: int) -> Dict[str, float]:
+    """Search latency using stored vectors as probes (no provider calls)."""
+    n = tbl.count_rows()
+    if not n or samples <= 0:
+        return {"mean_ms": 0.0, "p95_ms": 0.0}
+    layout = _table_layout(tbl.schema)
+    idx = np.linspace(0, n - 1, num=min(samples, n), dtype=int).tolist()
+    cols = ["vector_int8", "vector_scale"] if layout.rescore else ["vector"]
+    probe = tbl.to_lance().take(idx, columns=cols)
+    if layout.rescore:
+        queries = _dequantize(probe.column("vector_int8").to_pylist(), probe.column("vector_scale").to_pylist())
+    else:
+        queries = np.asarray(probe.column("vector").to_pylist(), dtype=np.float32)
+
+    timings = []
+    for q in queries:
+        start = time.perf_counter()
+        _search_vector(tbl, q, k, layout=layout)
+        timings.append((time.perf_counter() - start) * 1000.0)
+    return {"mean_ms": sum(timings) / len(timings), "p95_ms": percentile(timings, 95)}
+
+
+def table_stats(latency_samples: int = 20) -> Dict[str, Any]:
+    """Rows, fragments, versions, on-disk size, vector layout and probe query latency."""
+    conn = _conn()
+    table_name = _table_name()
+    if not _table_exists(conn, table_name):
+        return {"exists": False}
+    tbl = conn.open_table(table_name)
+    ds = tbl.to_lance()
+    layout = _table_layout(tbl.schema)
+    return {
+        "exists": True,
+        "rows": tbl.count_rows(),
+        "fragments": len(ds.get_fragments()),
+        "versions": len(ds.versions()),
+        "size_bytes": _dir_size(Path(ds.uri)),
+        "layout": {"full_dim": layout.full_dim, "dim": layout.dim, "dtype": layout.dtype, "rescore": layout.rescore},
+        "latency": _probe_latency(tbl, latency_samples, int(settings.TOP_K)),
+    }
+
+
+def _relayout(data: pa.Table, current: VectorLayout, target: VectorLayout) -> pa.Table:
+    """Rows of a table in `current` layout, re-encoded into `target`."""
+    if not current.compact:
+        full = np.asarray(data.column("vector").to_pylist(), dtype=np.float32)
+    elif current.rescore:
+        full = _dequantize(data.column("vector_int8").to_pylist(), data.column("vector_scale").to_pylist())
+    elif current.dim == current.full_dim:
+        full = np.asarray(data.column("vector").to_pylist(), dtype=np.float32)  # float16 -> widened
+    else:
+        raise ValueError("Full-dimension vectors are not stored in this table; reset the store and re-index")
+    out = data.select([n for n in data.schema.names if n not in ("vector", "vector_int8", "vector_scale")])
+    for name, arr in _vector_columns(full.reshape(-1, current.full_dim), target).items():
+        out = out.append_column(name, arr)
+    return out
+
+
+def requantize_store() -> bool:
+    """
+    Rewrite the table into the layout requested by VECTOR_DIM / VECTOR_DTYPE /
+    VECTOR_RESCORE_INT8. Returns False if the table already matches.
+    Compaction is one-way: once a table is compact its float32 vectors are gone,
+    so it can be re-encoded into other compact layouts but not back to full
+    float32 (reset the store and re-index for that).
+
+    Raises StoreBusy while an indexing job is running. Rows another process
+    appends during the rewrite are carried over into the new table.
+    """
+    from app.jobs import running_jobs
+
+    conn = _conn()
+    table_name = _table_name()
+    if not _table_exists(conn, table_name):
+        return False
+    with _WRITE_LOCK:
+        busy = running_jobs()
+        if busy:
+            raise StoreBusy(f"Indexing in progress ({len(busy)} job(s)); retry the rewrite when it has finished")
+        tbl = conn.open_table(table_name)
+        current = _table_layout(tbl.schema)
+        target = _target_layout(current.full_dim)
+        if target == current:
+            return False
+        if current.compact and not target.compact:
+            raise ValueError("This table was compacted and no longer stores float32 vectors; "
+                             "reset the store and re-index to go back to full precision")
+        if current.rescore:
+            logger.warning("Re-encoding from int8 codes: the new layout inherits their quantization error")
+
+        read_version = tbl.version
+        old_schema = tbl.schema
+        data = tbl.to_arrow()
+        conn.create_table(table_name, data=_relayout(data, current, target), mode="overwrite")
+
+        # Writers in other processes may have committed between the read and the overwrite:
+        # the newest version still in the old layout holds everything they added
+        ds = conn.open_table(table_name).to_lance()
+        later = [v["version"] for v in ds.versions() if v["version"] > read_version]
+        before = max((v for v in later if ds.checkout_version(v).schema == old_schema), default=None)
+        if before is not None:
+            old = ds.checkout_version(before).to_table()
+            missed = old.filter(pc.invert(pc.is_in(old.column("id"), value_set=data.column("id").combine_chunks())))
+            if missed.num_rows:
+                logger.warning(f"Carrying over {missed.num_rows} rows written during the rewrite")
+                conn.open_table(table_name).merge_insert("id").when_not_matched_insert_all().execute(
+                    _relayout(missed, _table_layout(old.schema), target))
+        _update_id_index(conn.open_table(table_name))  # the overwrite dropped it
+    return True
+
+
+def optimize_store(requantize: bool = False, cleanup_older_than: timedelta = timedelta(days=7),
+                   latency_samples: int = 20) -> Dict[str, Any]:
+    """
+    Table maintenance: optional re-layout of vectors, fragment compaction, a
+    scalar index on `id` (neighbour lookups in retrieve) and removal of old
+    versions. Returns before/after stats.
+    """
+    before = table_stats(latency_samples)
+    if not before.get("exists"):
+        return {"before": before, "after": before}
+
+    requantized = requantize_store() if requantize else False
+    tbl = _conn().open_table(_table_name())
+    compaction = tbl.compact_files()
+    tbl.create_scalar_index("id", replace=True)  # rebuilt so rows appended since the last run are covered
+    cleanup = tbl.cleanup_old_versions(older_than=cleanup_older_than)
+
+    return {
+        "before": before,
+        "requantized": requantized,
+        "compaction": {"fragments_removed": compaction.fragments_removed,
+                       "fragments_added": compaction.fragments_added},
+        "cleanup": {"bytes_removed": cleanup.bytes_removed, "old_versions": cleanup.old_versions},
+        "after": table_stats(latency_samples),
+    }
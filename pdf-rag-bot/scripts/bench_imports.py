@@ -0,0 +1,95 @@
+# scripts/bench_imports.py
+"""
+Cold-start benchmark for the API and the Streamlit app.
+
+Each measurement runs in a fresh interpreter:
+  - api:       `import app.api` (what `uvicorn app.api:app` does before serving)
+  - streamlit: first run and one rerun of ui/streamlit_app.py via streamlit's AppTest
+
+    python scripts/bench_imports.py                      # this checkout
+    python scripts/bench_imports.py --compare ../old     # also another checkout, with the reduction
+    python scripts/bench_imports.py --top 15             # slowest modules behind `import app.api`
+"""
+from __future__ import annotations
+
+import argparse
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+
+_API = """
+import time
+t = time.perf_counter()
+import app.api
+print(time.perf_counter() - t)
+"""
+
+_UI = """
+import time
+from streamlit.testing.v1 import AppTest
+at = AppTest.from_file("ui/streamlit_app.py", default_timeout=300)
+at.secrets["BENCH"] = "1"  # avoid the missing-secrets warning element
+t = time.perf_counter()
+at.run()
+first = time.perf_counter() - t
+t = time.perf_counter()
+at.run()
+print(first, time.perf_counter() - t)
+"""
+
+
+def _run(root: Path, code: str) -> list[float]:
+    out = subprocess.run([sys.executable, "-c", code], cwd=root, capture_output=True, text=True, check=True)
+    return [float(x) for x in out.stdout.strip().splitlines()[-1].split()]
+
+
+def measure(root: Path, repeat: int) -> dict[str, float]:
+    api = [_run(root, _API)[0] for _ in range(repeat)]
+    ui = [_run(root, _UI) for _ in range(repeat)]
+    return {
+        "api import": statistics.median(api),
+        "streamlit first run": statistics.median(u[0] for u in ui),
+        "streamlit rerun": statistics.median(u[1] for u in ui),
+    }
+
+
+def top_modules(root: Path, n: int) -> list[tuple[int, str]]:
+    out = subprocess.run([sys.executable, "-X", "importtime", "-c", "import app.api"],
+                         cwd=root, capture_output=True, text=True, check=True)
+    rows = []
+    for line in out.stderr.splitlines():
+        parts = line.split("|")
+        if len(parts) == 3 and parts[1].strip().isdigit():
+            rows.append((int(parts[1]), parts[2].rstrip()))
+    return sorted(rows, reverse=True)[:n]
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=3, help="fresh interpreters per measurement (median)")
+    parser.add_argument("--compare", type=Path, help="another checkout of pdf-rag-bot to compare against")
+    parser.add_argument("--top", type=int, default=0, help="show the N slowest modules imported by app.api")
+    args = parser.parse_args(argv)
+
+    current = measure(ROOT, args.repeat)
+    other = measure(args.compare.resolve(), args.repeat) if args.compare else None
+
+    header = f"{'':22}{'this':>10}" + (f"{'compare':>10}{'reduction':>11}" if other else "")
+    print(header)
+    for key, value in current.items():
+        line = f"{key:22}{value:>9.2f}s"
+        if other:
+            line += f"{other[key]:>9.2f}s{1 - value / other[key]:>10.0%}"
+        print(line)
+
+    if args.top:
+        print(f"\nslowest imports behind `import app.api` (cumulative ms):")
+        for us, name in top_modules(ROOT, args.top):
+            print(f"{us / 1000:>9.1f}  {name}")
+
+
+if __name__ == "__main__":
+    main()
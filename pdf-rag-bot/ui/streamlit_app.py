@@ -7,15 +7,47 @@ import uuid
 import streamlit as st
 
 from app.config import settings
-from app.loaders import load_pdfs
-from app.chunking import chunk_documents
-from app.vectorstore import index_documents, list_sources, reset_store
-from app.chains import build_rag_chain
-from app.retriever import retrieve
+from app.jobs import NO_TEXT, get_queue
+# LanceDB / LangChain / provider SDKs are imported where first used, so the
+# first page render does not wait for them.
 
 st.set_page_config(page_title="PDF RAG Chatbot", layout="wide")
 st.title("📄 PDF RAG Chatbot")
 
+# ---------------- Cached backend (shared across sessions & reruns) ---------------- #
+# The LanceDB connection and the query embedder are process-wide singletons in
+# app.vectorstore / app.embeddings; the chain and query results are cached here.
+# Query results are keyed on the table version, so writes made outside this session
+# (API uploads, background jobs, other processes) are never served stale.
+@st.cache_resource(show_spinner=False)
+def _rag_chain():
+    from app.chains import build_rag_chain
+    return build_rag_chain()
+
+
+def _table_version() -> str:
+    from app.vectorstore import table_version
+    return table_version()
+
+
+@st.cache_data(show_spinner=False, max_entries=512)
+def _retrieve(query: str, sources: tuple, corpus_id: str | None, k: int, version: str):
+    from app.retriever import retrieve
+    return retrieve(query, where={"source": list(sources)}, k=k, corpus_id=corpus_id)
+
+
+@st.cache_data(show_spinner=False)
+def _list_sources(corpus_id: str | None, version: str):
+    from app.vectorstore import list_sources
+    return list_sources(corpus_id=corpus_id)
+
+
+def _invalidate_corpus_caches():
+    """Drop entries for the old table version right away instead of waiting for eviction."""
+    _retrieve.clear()
+    _list_sources.clear()
+
+
 # ---------------- Session state ---------------- #
 if "messages" not in st.session_state:
     st.session_state["messages"] = []
@@ -29,6 +61,24 @@ if "active_sources" not in st.session_state:
     st.session_state["active_sources"] = []     # applied filter for retrieval
 if "last_docs" not in st.session_state:
     st.session_state["last_docs"] = []
+if "index_job" not in st.session_state:
+    st.session_state["index_job"] = None        # background indexing job being polled
+
+# ---------------- Cold start from snapshot ---------------- #
+if settings.SNAPSHOT_PATH and "snapshot_checked" not in st.session_state:
+    from app.snapshot import restore_on_startup
+    from app.vectorstore import corpus_catalog
+    st.session_state["snapshot_checked"] = True
+    restore_on_startup()
+    # A table holding a single corpus (e.g. from a snapshot) can be queried right away;
+    # read from the live table, so a cleared or re-indexed store is never mistaken for the snapshot
+    catalog = corpus_catalog()
+    if st.session_state["corpus_id"] is None and len(catalog) == 1 and next(iter(catalog)):
+        corpus_id, sources = next(iter(catalog.items()))
+        st.session_state["corpus_id"] = corpus_id
+        st.session_state["available_sources"] = sorted(sources)
+        st.session_state["selected_sources"] = sorted(sources)
+        st.session_state["active_sources"] = sorted(sources)
 
 # ---------------- Sidebar: Upload + Index ---------------- #
 with st.sidebar:
@@ -37,7 +87,8 @@ with st.sidebar:
 
     col_idx, col_clear = st.columns([1, 1])
     with col_idx:
-        if st.button("Index", type="primary", use_container_width=True):
+        indexing = st.session_state["index_job"] is not None
+        if st.button("Index", type="primary", use_container_width=True, disabled=indexing):
             # Save uploads
             paths = []
             for f in files or []:
@@ -50,34 +101,22 @@ with st.sidebar:
             if not paths:
                 st.warning("Please upload at least one PDF to index.")
             else:
-                # Parse → chunk → tag with a NEW corpus_id → index
-                docs = load_pdfs(paths)
-                chunks = chunk_documents(docs)
-                if not chunks:
-                    st.warning("No text extracted from the uploaded PDFs. Please check the files.")
-                else:
-                    corpus_id = uuid.uuid4().hex
-                    for c in chunks:
-                        c.metadata = c.metadata or {}
-                        c.metadata["corpus_id"] = corpus_id
-                    index_documents(chunks)
-
-                    # 🟢 Immediately set sources from filenames we just indexed
-                    just_indexed_sources = [Path(p).name for p in paths]
-
-                    # Refresh session scope for this run
-                    st.session_state["corpus_id"] = corpus_id
-                    st.session_state["available_sources"] = just_indexed_sources[:]  # prefer this
-                    st.session_state["selected_sources"] = just_indexed_sources[:]
-                    st.session_state["active_sources"] = just_indexed_sources[:]
-
-                    st.success(f"Indexed {len(chunks)} chunks from {len(paths)} PDF(s).")
-                    # Re-render so the multiselect becomes clickable with new options
-                    st.rerun()
+                # Parse → chunk → tag with a NEW corpus_id → index, on a background worker
+                corpus_id = uuid.uuid4().hex
+                job_id = get_queue().submit(paths, corpus_id=corpus_id)
+                st.session_state["index_job"] = {
+                    "id": job_id,
+                    "corpus_id": corpus_id,
+                    "sources": [Path(p).name for p in paths],
+                }
+                st.rerun()
 
     with col_clear:
         if st.button("🧹 Clear ALL indexed data", use_container_width=True):
-            if reset_store():
+            from app.vectorstore import reset_store
+            cleared = reset_store()
+            _invalidate_corpus_caches()
+            if cleared:
                 st.session_state["corpus_id"] = None
                 st.session_state["available_sources"] = []
                 st.session_state["selected_sources"] = []
@@ -88,6 +127,69 @@ with st.sidebar:
             else:
                 st.error("Failed to clear the index. See logs.")
 
+    @st.fragment(run_every=1)
+    def _index_progress():
+        job_ref = st.session_state["index_job"]
+        if job_ref is None:
+            return
+        job = get_queue().get(job_ref["id"])
+        if job is None:
+            st.session_state["index_job"] = None
+            st.rerun()
+            return
+
+        status = job["status"]
+        if status == "succeeded":
+            st.session_state["index_job"] = None
+            _invalidate_corpus_caches()
+            # 🟢 Immediately set sources from filenames we just indexed
+            just_indexed_sources = job_ref["sources"]
+
+            # Refresh session scope for this run
+            st.session_state["corpus_id"] = job_ref["corpus_id"]
+            st.session_state["available_sources"] = just_indexed_sources[:]  # prefer this
+            st.session_state["selected_sources"] = just_indexed_sources[:]
+            st.session_state["active_sources"] = just_indexed_sources[:]
+            st.session_state["flash"] = (
+                "success", f"Indexed {job['rows_written']} chunks from {len(just_indexed_sources)} PDF(s)."
+            )
+            # Re-render so the multiselect becomes clickable with new options
+            st.rerun()
+            return
+
+        if status in ("failed", "cancelled"):
+            retryable = True
+            if job["error"] == NO_TEXT:
+                st.warning("No text extracted from the uploaded PDFs. Please check the files.")
+                retryable = False
+            elif status == "failed":
+                st.error(f"Indexing failed: {job['error']}")
+            else:
+                st.warning("Indexing cancelled.")
+            col_retry, col_dismiss = st.columns([1, 1])
+            if retryable and col_retry.button("Retry", use_container_width=True):
+                get_queue().retry(job_ref["id"])
+                st.rerun()
+            if col_dismiss.button("Dismiss", use_container_width=True):
+                st.session_state["index_job"] = None
+                st.rerun()
+            return
+
+        total = job["chunks_total"]
+        st.progress(
+            job["rows_written"] / total if total else 0.0,
+            text=f"Indexing ({status}): {job['pages_parsed']} pages parsed, "
+                 f"{job['chunks_embedded']}/{total} chunks embedded, {job['rows_written']} rows written",
+        )
+        if st.button("Cancel indexing", use_container_width=True, disabled=job["cancel_requested"]):
+            get_queue().cancel(job_ref["id"])
+
+    _index_progress()
+
+    flash = st.session_state.pop("flash", None)
+    if flash:
+        getattr(st, flash[0])(flash[1])
+
     st.divider()
     st.header("Restrict to document(s)")
 
@@ -102,7 +204,7 @@ with st.sidebar:
         current_options = st.session_state["available_sources"][:]
         if not current_options:
             # Fallback discovery (may vary by Lance/Arrow versions)
-            current_options = list_sources(corpus_id=st.session_state["corpus_id"])
+            current_options = _list_sources(st.session_state["corpus_id"], _table_version())
             st.session_state["available_sources"] = current_options[:]
         # If options changed, reset selection to all by default
         if sorted(st.session_state["selected_sources"]) != sorted(current_options):
@@ -153,19 +255,21 @@ if query:
         where = {"source": st.session_state["active_sources"]}
 
         with st.spinner("Thinking…"):
-            # Restrict by corpus + filenames
-            docs = retrieve(
+            # Restrict by corpus + filenames (memoized per query/sources/corpus/table version)
+            docs = _retrieve(
                 query,
-                where=where,
-                k=int(getattr(settings, "TOP_K", 6)),
-                corpus_id=st.session_state["corpus_id"],
+                tuple(sorted(st.session_state["active_sources"])),
+                st.session_state["corpus_id"],
+                int(getattr(settings, "TOP_K", 6)),
+                _table_version(),
             )
             st.session_state["last_docs"] = docs
 
-            chain = build_rag_chain()
+            chain = _rag_chain()
             payload = {"question": query}
             payload["where"] = where
             payload["corpus_id"] = st.session_state["corpus_id"]
+            payload["docs"] = docs  # already retrieved above; the chain skips its own search
 
             result = chain.invoke(payload, config={"configurable": {"session_id": session_id}})
             answer = result.content if hasattr(result, "content") else str(result)